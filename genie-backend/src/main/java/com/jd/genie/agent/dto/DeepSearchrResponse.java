@@ -18,7 +18,7 @@ public class DeepSearchrResponse {
     private SearchResult searchResult;
     private Boolean isFinal;
     private Boolean searchFinish; // 搜索结果是否结束
-    private String messageType; // extend、search、report
+    private String messageType; // extend、search_progress、search、report
 
     @Data
     @Builder
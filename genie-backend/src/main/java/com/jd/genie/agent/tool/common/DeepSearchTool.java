@@ -206,6 +206,10 @@ public class DeepSearchTool implements BaseTool {
                                         messageId = StringUtil.getUUID();
                                         searchResponse.setSearchFinish(false);
                                         agentContext.getPrinter().send(messageId, "deep_search", searchResponse, digitalEmployee, true);
+                                    } else if ("search_progress".equals(searchResponse.getMessageType())) {
+                                        // 单个子查询完成，刷新同一条消息的搜索结果
+                                        searchResponse.setSearchFinish(false);
+                                        agentContext.getPrinter().send(messageId, "deep_search", searchResponse, digitalEmployee, true);
                                     } else if ("search".equals(searchResponse.getMessageType())) {
                                         searchResponse.setSearchFinish(true);
                                         agentContext.getPrinter().send(messageId, "deep_search", searchResponse, digitalEmployee, true);
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# =====================
+# 网页正文抽取基准：对比旧路径（事件循环内 BeautifulSoup + 多次 get_text）与新抽取阶段的
+# 吞吐和事件循环卡顿
+#
+# 用法: python -m benchmark.bench_page_extract [--html-dir DIR] [--docs 40] [--rounds 3]
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import glob
+import os
+import random
+import time
+from optparse import OptionParser
+from typing import List
+
+from bs4 import BeautifulSoup
+
+from genie_tool.tool.search_component.extractor import EXTRACTORS, _PageExtractor
+
+
+def synthetic_page(seed: int, paragraphs: int = 200) -> str:
+    rnd = random.Random(seed)
+    words = ["搜索", "深度", "模型", "数据", "search", "engine", "latency", "cache", "页面", "正文"]
+    body = "".join(
+        f"<p class='content'>{' '.join(rnd.choice(words) for _ in range(60))}</p>" for _ in range(paragraphs))
+    nav = "".join(f"<li><a href='/p/{i}'>menu {i}</a></li>" for i in range(80))
+    script = "var x = 1;" * 500
+    return (f"<html><head><title>page {seed}</title><style>body{{color:red}}</style></head><body>"
+            f"<nav class='navbar'><ul>{nav}</ul></nav><script>{script}</script>"
+            f"<article>{body}</article><footer>copyright</footer></body></html>")
+
+
+def load_pages(html_dir: str, docs: int) -> List[str]:
+    if html_dir:
+        files = sorted(glob.glob(os.path.join(html_dir, "*.htm*")))[:docs]
+        return [open(f, encoding="utf-8", errors="ignore").read() for f in files]
+    return [synthetic_page(i) for i in range(docs)]
+
+
+def legacy_extract(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.get_text() if soup.get_text() and len(soup.get_text().strip()) > 50 else str(soup.text)
+
+
+async def _heartbeat(stop: asyncio.Event, lags: List[float], interval: float = 0.005):
+    """每 interval 秒醒一次，记录实际延迟，用于衡量事件循环卡顿"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def run_case(name: str, pages: List[str], extract) -> dict:
+    stop = asyncio.Event()
+    lags: List[float] = []
+    hb = asyncio.create_task(_heartbeat(stop, lags))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    texts = await extract(pages)
+    cost = time.perf_counter() - start
+    stop.set()
+    await hb
+    lags = sorted(lags) or [0.0]
+    return {
+        "case": name,
+        "docs/s": round(len(pages) / cost, 1),
+        "total_ms": int(cost * 1000),
+        "max_stall_ms": round(lags[-1] * 1000, 1),
+        "p99_stall_ms": round(lags[int(len(lags) * 0.99) - 1 if len(lags) > 1 else 0] * 1000, 1),
+        "avg_chars": int(sum(len(t) for t in texts) / max(len(texts), 1)),
+    }
+
+
+async def main(html_dir: str, docs: int, rounds: int, workers: int):
+    pages = load_pages(html_dir, docs)
+
+    async def _legacy(ps):
+        return [legacy_extract(p) for p in ps]
+
+    cases = [("legacy bs4 on loop", _legacy)]
+    for backend in EXTRACTORS:
+        for mode in ["inline", "thread", "process"]:
+            extractor = _PageExtractor()
+            extractor.mode, extractor.backend, extractor._max_workers = mode, backend, workers
+
+            async def _new(ps, _extractor=extractor):
+                return await asyncio.gather(*[_extractor.extract(p) for p in ps])
+
+            cases.append((f"{backend} {mode}", _new, extractor))
+
+    for name, func, *extractor in cases:
+        results = [await run_case(name, pages, func) for _ in range(rounds)]
+        best = min(results, key=lambda r: r["total_ms"])
+        print(" | ".join(f"{k}={v}" for k, v in best.items()))
+        for e in extractor:
+            e.shutdown()
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("--html-dir", dest="html_dir", type="string", default="")
+    parser.add_option("--docs", dest="docs", type="int", default=40)
+    parser.add_option("--rounds", dest="rounds", type="int", default=3)
+    parser.add_option("--workers", dest="workers", type="int", default=2)
+    (options, args) = parser.parse_args()
+    asyncio.run(main(options.html_dir, options.docs, options.rounds, options.workers))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# =====================
+# 多引擎融合排序离线评估：对比 RRF top-N 与完整合并列表（全部抓取）的召回，以及按原拼接顺序截断的基线
+#
+# 采集: python -m benchmark.eval_rank_fusion --collect --queries queries.txt --data rank_fusion.jsonl
+# 评估: python -m benchmark.eval_rank_fusion --data rank_fusion.jsonl --top-n 5,10,15,20
+#
+# 数据每行: {"query": str, "results": {engine: [{"title", "link", "content"}, ...]}, "relevant": [link, ...]}
+# relevant 为人工标注的相关链接，缺省时用标题+摘要覆盖查询词比例 >= --min-coverage 作为相关性近似
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import json
+from optparse import OptionParser
+from typing import Dict, List, Set
+
+from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.passage_index import tokenize
+from genie_tool.tool.search_component.rank_fusion import fuse_and_cut, parse_engine_weights
+from genie_tool.tool.search_component.url_canonical import merge_docs_by_url, url_key
+
+
+def query_terms(text: str) -> Set[str]:
+    return set(tokenize(text))
+
+
+def load_docs(sample: dict) -> List[Doc]:
+    """按引擎顺序拼接，等价于 MixSearch 合并前的结果"""
+    return [
+        Doc(doc_type="web_page", content=r.get("content", ""), title=r.get("title", ""), link=r.get("link", ""),
+            data={"search_engine": engine})
+        for engine, results in sample["results"].items() for r in results
+    ]
+
+
+def relevant_keys(sample: dict, docs: List[Doc], min_coverage: float) -> Set[str]:
+    if sample.get("relevant"):
+        return {url_key(link) for link in sample["relevant"]}
+    terms = query_terms(sample["query"])
+    if not terms:
+        return set()
+    return {
+        url_key(doc.link) for doc in docs
+        if len(terms & query_terms(f"{doc.title} {doc.content}")) / len(terms) >= min_coverage
+    }
+
+
+def recall(docs: List[Doc], relevant: Set[str]) -> float:
+    return len({url_key(doc.link) for doc in docs} & relevant) / len(relevant)
+
+
+def evaluate(samples: List[dict], top_ns: List[int], k: int, engine_weights: Dict[str, float], min_coverage: float):
+    rows = {n: {"fused": [], "naive": [], "pages": []} for n in top_ns}
+    full_pages = []
+    for sample in samples:
+        merged = merge_docs_by_url(load_docs(sample))
+        # 完整列表即当前全部抓取的召回上限，只统计完整列表里出现的相关文档
+        relevant = relevant_keys(sample, merged, min_coverage) & {url_key(doc.link) for doc in merged}
+        if not relevant:
+            continue
+        full_pages.append(len(merged))
+        fused = fuse_and_cut(list(merged), k=k, engine_weights=engine_weights)
+        for n in top_ns:
+            rows[n]["fused"].append(recall(fused[:n], relevant))
+            rows[n]["naive"].append(recall(merged[:n], relevant))
+            rows[n]["pages"].append(min(n, len(merged)))
+    if not full_pages:
+        print("no sample with relevant docs")
+        return
+    print(f"samples={len(full_pages)} avg_full_pages={sum(full_pages) / len(full_pages):.1f} full_recall=1.000")
+    for n, row in rows.items():
+        print(f"top_n={n} | pages={sum(row['pages']) / len(row['pages']):.1f} | "
+              f"fused_recall={sum(row['fused']) / len(row['fused']):.3f} | "
+              f"naive_recall={sum(row['naive']) / len(row['naive']):.3f}")
+
+
+async def collect(queries_file: str, data_file: str):
+    """调用 MixSearch 各子引擎（不抓取网页）采集原始排名"""
+    from genie_tool.tool.search_component.search_engine import MixSearch
+
+    mix_search = MixSearch()
+    engines = [mix_search._bing_engine, mix_search._jina_engine, mix_search._sogou_engine, mix_search._serp_engine]
+    with open(queries_file, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    with open(data_file, "w", encoding="utf-8") as f:
+        for query in queries:
+            docs_list = await asyncio.gather(*[e.cached_search(query=query) for e in engines], return_exceptions=True)
+            results = {
+                engine._engine: [{"title": d.title, "link": d.link, "content": d.content} for d in docs]
+                for engine, docs in zip(engines, docs_list) if not isinstance(docs, BaseException)
+            }
+            f.write(json.dumps({"query": query, "results": results}, ensure_ascii=False) + "\n")
+            print(f"{query}: {', '.join(f'{e}={len(r)}' for e, r in results.items())}")
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("--data", dest="data", type="string", default="rank_fusion.jsonl")
+    parser.add_option("--collect", dest="collect", action="store_true", default=False)
+    parser.add_option("--queries", dest="queries", type="string", default="")
+    parser.add_option("--top-n", dest="top_n", type="string", default="5,10,15,20")
+    parser.add_option("--rrf-k", dest="rrf_k", type="int", default=60)
+    parser.add_option("--engine-weights", dest="engine_weights", type="string", default="")
+    parser.add_option("--min-coverage", dest="min_coverage", type="float", default=0.5)
+    (options, args) = parser.parse_args()
+    if options.collect:
+        asyncio.run(collect(options.queries, options.data))
+    else:
+        with open(options.data, encoding="utf-8") as f:
+            data = [json.loads(line) for line in f if line.strip()]
+        evaluate(data, [int(n) for n in options.top_n.split(",")], options.rrf_k,
+                 parse_engine_weights(options.engine_weights), options.min_coverage)
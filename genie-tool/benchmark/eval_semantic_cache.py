@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# =====================
+# 语义缓存离线评估：按顺序回放查询，统计不同阈值下的命中率和误命中率，用于确定 SEMANTIC_CACHE_THRESHOLD
+#
+# 评估: python -m benchmark.eval_semantic_cache --data semantic_cache.jsonl --thresholds 0.8,0.85,0.9,0.95
+#
+# 数据每行: {"query": str, "group": str}，group 相同表示同一意图的不同问法（可以复用缓存），不同则命中即为误命中
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import json
+from optparse import OptionParser
+from typing import List
+
+from genie_tool.util.semantic_cache import SemanticIndex, ngram_vector, numbers
+
+
+def evaluate(samples: List[dict], thresholds: List[float], ngram: int, dim: int, max_chars: int, show: int):
+    vectors = [ngram_vector(s["query"], n=ngram, dim=dim, max_chars=max_chars) for s in samples]
+    print(f"samples={len(samples)} groups={len({s['group'] for s in samples})}")
+    for threshold in thresholds:
+        index = SemanticIndex(dim=dim, max_size=len(samples) + 1, ttl=float("inf"))
+        seen_groups = set()
+        hits, false_hits, opportunities, correct_hits = 0, [], 0, 0
+        for sample, vector in zip(samples, vectors):
+            text_numbers = numbers(sample["query"])
+            # 之前出现过同组查询时才有正确命中的机会
+            opportunity = sample["group"] in seen_groups
+            opportunities += opportunity
+            entry, similarity = index.search(vector, text_numbers, threshold)
+            if entry is None:
+                index.add(vector, text_numbers, [sample["group"], sample["query"]])
+                seen_groups.add(sample["group"])
+                continue
+            hits += 1
+            if entry["value"][0] == sample["group"]:
+                correct_hits += 1
+            else:
+                false_hits.append((similarity, sample["query"], entry["value"][1]))
+        print(f"threshold={threshold} | hit_rate={hits / len(samples):.3f} | "
+              f"false_hit_rate={len(false_hits) / hits if hits else 0.0:.3f} | "
+              f"recall={correct_hits / opportunities if opportunities else 0.0:.3f} | "
+              f"hits={hits} false_hits={len(false_hits)} opportunities={opportunities}")
+        for similarity, query, cached_query in sorted(false_hits, reverse=True)[:show]:
+            print(f"    {similarity:.3f} {query} -> {cached_query}")
+
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("--data", dest="data", type="string", default="semantic_cache.jsonl")
+    parser.add_option("--thresholds", dest="thresholds", type="string", default="0.8,0.85,0.9,0.95")
+    parser.add_option("--ngram", dest="ngram", type="int", default=3)
+    parser.add_option("--dim", dest="dim", type="int", default=2048)
+    parser.add_option("--max-chars", dest="max_chars", type="int", default=20000)
+    parser.add_option("--show", dest="show", type="int", default=5, help="每个阈值打印相似度最高的误命中条数")
+    (options, args) = parser.parse_args()
+    with open(options.data, encoding="utf-8") as f:
+        data = [json.loads(line) for line in f if line.strip()]
+    evaluate(data, [float(t) for t in options.thresholds.split(",")], options.ngram, options.dim,
+             options.max_chars, options.show)
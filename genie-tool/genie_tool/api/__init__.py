@@ -10,10 +10,12 @@ from fastapi import APIRouter
 from .tool import router as tool_router
 from .file_manage import router as file_router
 from .knowledge import router as knowledge_router
+from .metrics import router as metrics_router
 
 api_router = APIRouter(prefix="/v1")
 
 api_router.include_router(tool_router, prefix="/tool", tags=["tool"])
 api_router.include_router(file_router, prefix="/file_tool", tags=["file_manage"])
 api_router.include_router(knowledge_router, prefix="/knowledge", tags=["knowledge"])
+api_router.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
 
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+from typing import Optional
+
+from fastapi import APIRouter
+
+from genie_tool.model.context import LLMModelInfoFactory
+from genie_tool.tool.search_component.engine_stats import EngineStats
+from genie_tool.tool.search_component.fetch_scheduler import FetchScheduler
+from genie_tool.tool.search_component.page_cache import PageContentCache
+from genie_tool.tool.search_component.page_fetcher import PageFetchFlight
+from genie_tool.tool.search_component.search_cache import SearchResultCache
+from genie_tool.tool.search_component.search_engine import SearchFlight
+from genie_tool.util.http_util import HttpClientPool
+from genie_tool.util.llm_cache import LLMResponseCache
+from genie_tool.util.llm_scheduler import LLMScheduler
+from genie_tool.util.middleware_util import RequestHandlerRoute
+from genie_tool.util.semantic_cache import SemanticCache
+from genie_tool.util.token_usage import TokenUsageRecorder
+
+router = APIRouter(route_class=RequestHandlerRoute)
+
+
+@router.get("/http_pool")
+async def get_http_pool_metrics():
+    """HTTP 连接池指标"""
+    return {"code": 200, "data": HttpClientPool.metrics()}
+
+
+@router.get("/search_cache")
+async def get_search_cache_metrics():
+    """搜索结果缓存命中统计"""
+    return {"code": 200, "data": SearchResultCache.metrics()}
+
+
+@router.get("/page_cache")
+async def get_page_cache_metrics():
+    """网页正文缓存统计"""
+    return {"code": 200, "data": PageContentCache.metrics()}
+
+
+@router.get("/fetch_scheduler")
+async def get_fetch_scheduler_metrics():
+    """网页抓取调度排队统计"""
+    return {"code": 200, "data": FetchScheduler.metrics()}
+
+
+@router.get("/search_engines")
+async def get_search_engine_metrics():
+    """各搜索引擎耗时、错误率、熔断状态和当前超时"""
+    return {"code": 200, "data": EngineStats.metrics()}
+
+
+@router.get("/singleflight")
+async def get_singleflight_metrics():
+    """相同搜索/网页抓取并发请求合并统计"""
+    return {"code": 200, "data": {"search": SearchFlight.metrics(), "page_fetch": PageFetchFlight.metrics()}}
+
+
+@router.get("/llm_cache")
+async def get_llm_cache_metrics():
+    """LLM 响应缓存各调用点命中统计"""
+    return {"code": 200, "data": LLMResponseCache.metrics()}
+
+
+@router.get("/semantic_cache")
+async def get_semantic_cache_metrics():
+    """LLM 语义缓存各调用点命中统计"""
+    return {"code": 200, "data": SemanticCache.metrics()}
+
+
+@router.get("/llm_scheduler")
+async def get_llm_scheduler_metrics():
+    """LLM 调度：各模型并发、token 额度、各优先级排队耗时、拒绝/超时/429 次数"""
+    return {"code": 200, "data": LLMScheduler.metrics()}
+
+
+@router.get("/llm_router")
+async def get_llm_router_metrics():
+    """LLM 模型路由：各模型首 token 耗时、输出速度、失败次数和健康状态"""
+    return {"code": 200, "data": LLMModelInfoFactory.metrics()}
+
+
+@router.get("/token_usage")
+async def get_token_usage_metrics(request_id: Optional[str] = None):
+    """LLM token 使用量：按模型汇总及写入统计；指定 request_id 时返回该请求最近的使用量"""
+    if request_id:
+        return {"code": 200, "data": TokenUsageRecorder.get(request_id)}
+    return {"code": 200, "data": TokenUsageRecorder.metrics()}
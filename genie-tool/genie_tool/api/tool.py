@@ -10,23 +10,33 @@ import os
 import time
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from sse_starlette import ServerSentEvent, EventSourceResponse
 
 from genie_tool.model.code import ActionOutput, CodeOuput
+from genie_tool.model.context import RequestIdCtx
 from genie_tool.model.protocal import CIRequest, ReportRequest, DeepSearchRequest
 from genie_tool.util.file_util import upload_file
 from genie_tool.tool.report import report
 from genie_tool.tool.code_interpreter import code_interpreter_agent
+from genie_tool.util.llm_scheduler import LLMScheduler
 from genie_tool.util.middleware_util import RequestHandlerRoute
 from genie_tool.tool.deepsearch import DeepSearch
 
 router = APIRouter(route_class=RequestHandlerRoute)
 
 
+def _bind_request_id(request_id: str):
+    """使用业务请求 ID，LLM token 使用量据此写回对应的对话记录"""
+    if request_id:
+        RequestIdCtx.request_id = request_id
+
+
 @router.post("/code_interpreter")
 async def post_code_interpreter(
     body: CIRequest,
 ):
+    _bind_request_id(body.request_id)
      # 处理文件路径
     if body.file_names:
         for idx, f_name in enumerate(body.file_names):
@@ -155,6 +165,12 @@ async def post_code_interpreter(
 async def post_report(
     body: ReportRequest,
 ):
+    _bind_request_id(body.request_id)
+    # 背压：LLM 排队已满时直接拒绝批量报告，避免挤占交互式请求
+    if LLMScheduler.overloaded(os.getenv("REPORT_MODEL", "gpt-4.1"), "batch"):
+        return JSONResponse(status_code=429, content={
+            "code": 429, "message": "LLM 服务繁忙，请稍后重试", "requestId": body.request_id})
+
     # 处理文件路径
     if body.file_names:
         for idx, f_name in enumerate(body.file_names):
@@ -257,6 +273,7 @@ async def post_deepsearch(
     body: DeepSearchRequest,
 ):
     """深度搜索端点"""
+    _bind_request_id(body.request_id)
     deepsearch = DeepSearch(engines=body.search_engines)
     async def _stream():
         async for chunk in deepsearch.run(
@@ -265,6 +282,7 @@ async def post_deepsearch(
                 max_loop=body.max_loop,
                 stream=True,
                 stream_mode=body.stream_mode,
+                progressive=body.progressive,
         ):
             yield ServerSentEvent(data=chunk)
         yield ServerSentEvent(data="[DONE]")
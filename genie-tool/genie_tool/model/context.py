@@ -6,6 +6,9 @@
 # Date:   2025/7/8
 # =====================
 import contextvars
+import os
+import time
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -26,16 +29,103 @@ class _RequestIdCtx(object):
 RequestIdCtx = _RequestIdCtx()
 
 
+class _LLMPriorityCtx(object):
+    """当前请求的 LLM 调度优先级：interactive / default / batch"""
+
+    def __init__(self):
+        self._priority = contextvars.ContextVar("llm_priority", default="default")
+
+    @property
+    def priority(self):
+        return self._priority.get()
+
+    @priority.setter
+    def priority(self, value):
+        self._priority.set(value)
+
+
+LLMPriorityCtx = _LLMPriorityCtx()
+
+
 class LLMModelInfo(BaseModel):
     model: str
     context_length: int
     max_output: int
 
 
+class _ModelLiveStats(object):
+    """模型实时指标：首 token 耗时、输出速度（EWMA），连续失败达到阈值后冷却一段时间"""
+
+    def __init__(self, alpha: float):
+        self._alpha = alpha
+        self.ttft: Optional[float] = None
+        self.tps: Optional[float] = None
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+
+    def _ewma(self, prev: Optional[float], value: float) -> float:
+        return value if prev is None else self._alpha * value + (1 - self._alpha) * prev
+
+    @property
+    def healthy(self) -> bool:
+        return time.time() >= self.unhealthy_until
+
+    def record_success(self, ttft: Optional[float], tps: Optional[float]):
+        self.calls += 1
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        if ttft is not None:
+            self.ttft = self._ewma(self.ttft, ttft)
+        if tps is not None:
+            self.tps = self._ewma(self.tps, tps)
+
+    def record_failure(self, timeout: bool, max_failures: int, cooldown: float):
+        self.calls += 1
+        self.errors += 1
+        self.timeouts += timeout
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= max_failures:
+            self.unhealthy_until = time.time() + cooldown
+
+
 class _LLMModelInfoFactory:
+    """模型信息（上下文长度、最大输出），以及基于实时首 token 耗时/输出速度的模型路由
+
+    LLM_ROUTER_MODELS 中的模型互为备选：调用其中任一模型时，按预期耗时选择满足上下文长度的健康模型，
+    失败或超时依次回退。
+    """
 
     def __init__(self):
         self._factory = {}
+        self._stats: Dict[str, _ModelLiveStats] = {}
+
+    # 本模块在 load_dotenv 之前被导入，路由配置在使用时读取
+    @property
+    def router_enable(self) -> bool:
+        return os.getenv("LLM_ROUTER_ENABLE", "false") == "true"
+
+    @property
+    def router_models(self) -> List[str]:
+        return [m.strip() for m in os.getenv("LLM_ROUTER_MODELS", "").split(",") if m.strip()]
+
+    @property
+    def ttft_timeout(self) -> float:
+        return float(os.getenv("LLM_ROUTER_TTFT_TIMEOUT", 30))
+
+    @property
+    def stall_timeout(self) -> float:
+        return float(os.getenv("LLM_ROUTER_STALL_TIMEOUT", 60))
+
+    @property
+    def midstream_fallback(self) -> bool:
+        return os.getenv("LLM_ROUTER_MIDSTREAM_FALLBACK", "false") == "true"
+
+    @property
+    def continue_prompt(self) -> str:
+        return os.getenv("LLM_ROUTER_CONTINUE_PROMPT", "请从上次中断处继续输出，不要重复已输出的内容。")
 
     def register(self, model_info: LLMModelInfo):
         self._factory[model_info.model] = model_info
@@ -52,6 +142,65 @@ class _LLMModelInfoFactory:
         else:
             return default
 
+    def _live(self, model: str) -> _ModelLiveStats:
+        if model not in self._stats:
+            self._stats[model] = _ModelLiveStats(float(os.getenv("LLM_ROUTER_EWMA_ALPHA", 0.3)))
+        return self._stats[model]
+
+    def record_success(self, model: str, ttft: Optional[float], output_tokens: int, duration: float):
+        """ttft 为首 token 耗时（秒），duration 为首 token 之后的生成耗时"""
+        tps = output_tokens / duration if output_tokens >= 20 and duration > 0.2 else None
+        self._live(model).record_success(ttft, tps)
+
+    def record_failure(self, model: str, timeout: bool = False):
+        self._live(model).record_failure(
+            timeout, int(os.getenv("LLM_ROUTER_MAX_FAILURES", 3)), float(os.getenv("LLM_ROUTER_COOLDOWN", 60)))
+
+    def expected_latency(self, model: str, output_tokens: int) -> Optional[float]:
+        stats = self._stats.get(model)
+        if stats is None or stats.ttft is None:
+            return None
+        return stats.ttft + (output_tokens / stats.tps if stats.tps else 0.0)
+
+    def route(self, model: str, need_tokens: int, output_tokens: int) -> List[str]:
+        """按优先顺序返回候选模型，第一个为本次调用的模型，其余为回退顺序"""
+        if not self.router_enable or model not in self.router_models:
+            return [model]
+        pool = [model] + [m for m in self.router_models if m != model]
+        fit = [m for m in pool if self.get_context_length(m) >= need_tokens] or \
+            sorted(pool, key=lambda m: -self.get_context_length(m))
+
+        # 请求模型的预期耗时乘以该系数后再比较，其他模型需要明显更快才会被选中
+        switch_ratio = float(os.getenv("LLM_ROUTER_SWITCH_RATIO", 0.8))
+
+        def _score(m: str):
+            latency = self.expected_latency(m, output_tokens)
+            if latency is None:
+                # 没有样本时请求模型优先（借此积累样本），其他模型排在有样本的模型之后
+                return (0.0 if m == model else float("inf")), m != model
+            return latency * (switch_ratio if m == model else 1.0), m != model
+
+        healthy = sorted([m for m in fit if self._live(m).healthy], key=_score)
+        return healthy + [m for m in fit if m not in healthy]
+
+    def metrics(self) -> dict:
+        return {
+            "router_enable": self.router_enable,
+            "router_models": self.router_models,
+            "models": {
+                model: {
+                    "ttft": round(stats.ttft, 3) if stats.ttft is not None else None,
+                    "tps": round(stats.tps, 2) if stats.tps is not None else None,
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "timeouts": stats.timeouts,
+                    "consecutive_failures": stats.consecutive_failures,
+                    "healthy": stats.healthy,
+                    "context_length": self.get_context_length(model),
+                } for model, stats in self._stats.items()
+            },
+        }
+
 
 LLMModelInfoFactory = _LLMModelInfoFactory()
 
@@ -73,3 +73,5 @@ class DeepSearchRequest(BaseModel):
 
     stream: bool = Field(default=True, description="是否流式响应")
     stream_mode: Optional[StreamMode] = Field(default=StreamMode(), alias="streamMode", description="流式模式")
+    progressive: Optional[bool] = Field(
+        default=None, alias="progressiveSearch", description="是否逐个子查询推送搜索结果，默认取 DEEPSEARCH_PROGRESSIVE")
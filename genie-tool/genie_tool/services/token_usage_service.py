@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# =====================
+# Token使用量服务
+# Author: AI Assistant
+# Date: 2025/8/14
+# =====================
+import os
+
+from sqlalchemy import case, func, update
+from sqlmodel import select
+
+from genie_tool.db.db_engine import async_session_local
+from genie_tool.db.models.conversation import Conversation
+from genie_tool.db.models.session import Session
+from genie_tool.db.models.user import User
+
+
+class TokenUsageService:
+    """把请求的LLM Token使用量写入对话、会话和用户配额"""
+
+    def __init__(self):
+        # 配额单位：request 每个请求计 1 次（与 api_quota_daily 的次数语义一致），token 按 token 数计
+        self.quota_unit = os.getenv("LLM_USAGE_QUOTA_UNIT", "request")
+
+    async def apply_usage(self, request_id: str, tokens_used: int) -> bool:
+        """在同一事务中累加对话、会话和用户配额，失败整体回滚（重试不会重复计数）；找不到对应对话时返回 False"""
+        async with async_session_local() as db, db.begin():
+            result = await db.execute(select(Conversation).where(Conversation.request_id == request_id))
+            conversation = result.scalars().one_or_none()
+            if not conversation:
+                return False
+
+            # 同一请求可能分多批写入，配额按请求计时只在第一次写入时计数
+            first_flush = not conversation.token_usage
+            # 用 SQL 表达式原地累加，多进程同时写入同一会话/用户时不会丢失更新
+            await db.execute(
+                update(Conversation).where(Conversation.id == conversation.id)
+                .values(token_usage=func.coalesce(Conversation.token_usage, 0) + tokens_used))
+            await db.execute(
+                update(Session).where(Session.session_id == conversation.session_id)
+                .values(total_tokens_used=Session.total_tokens_used + tokens_used))
+
+            quota_used = tokens_used if self.quota_unit == "token" else int(first_flush)
+            if quota_used:
+                user_ids = select(Session.user_id).where(
+                    Session.session_id == conversation.session_id, Session.user_id.is_not(None))
+                await db.execute(
+                    update(User).where(User.id.in_(user_ids.scalar_subquery()))
+                    .values(api_quota_used=case(
+                        (func.coalesce(User.api_quota_used, 0) + quota_used > User.api_quota_daily,
+                         User.api_quota_daily),
+                        else_=func.coalesce(User.api_quota_used, 0) + quota_used,
+                    )))
+        return True
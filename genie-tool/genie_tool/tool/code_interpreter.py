@@ -10,7 +10,8 @@ import importlib
 import os
 import shutil
 import tempfile
-from typing import List, Optional
+import time
+from typing import List, Optional, Tuple
 
 import pandas as pd
 import yaml
@@ -18,9 +19,13 @@ from jinja2 import Template
 from smolagents import LiteLLMModel, FinalAnswerStep, PythonInterpreterTool, ChatMessageStreamDelta
 
 from genie_tool.tool.ci_agent import CIAgent
+from genie_tool.model.context import LLMPriorityCtx
 from genie_tool.util.file_util import download_all_files_in_path, upload_file, upload_file_by_path
+from genie_tool.util.llm_scheduler import LLMScheduler, estimate_message_tokens, is_rate_limited
 from genie_tool.util.log_util import timer
 from genie_tool.util.prompt_util import get_prompt
+from genie_tool.util.token_usage import TokenUsageRecorder
+from genie_tool.util.token_util import count_tokens
 import requests
 from genie_tool.model.code import ActionOutput, CodeOuput
 
@@ -88,7 +93,9 @@ async def code_interpreter_agent(
         )
 
         if stream:
-            for step in agent.run(task=str(template_task), stream=True, max_steps=10):
+            # smolagents 为同步执行，放到工作线程逐步推进，避免阻塞事件循环（LLM 调度的同步等待也在工作线程中）
+            steps = agent.run(task=str(template_task), stream=True, max_steps=10)
+            while (step := await asyncio.to_thread(next, steps, None)) is not None:
                 if isinstance(step, CodeOuput):
                     file_info = await upload_file(
                         content=step.code,
@@ -123,10 +130,9 @@ async def code_interpreter_agent(
                 elif isinstance(step, ChatMessageStreamDelta):
                     #yield step.content
                     pass
-                await asyncio.sleep(0)
                 
         else:
-            output = agent.run(task=task)
+            output = await asyncio.to_thread(agent.run, task=task)
             yield output
     except Exception as e:
         raise e
@@ -152,13 +158,75 @@ def get_new_file_by_path(output_dir):
     return temp_file
 
 
+class ScheduledLiteLLMModel(LiteLLMModel):
+    """接入 LLMScheduler 的 LiteLLMModel：与 ask_llm 共用按模型的并发和 token 额度，429 时暂停并重试
+
+    同步等待调度，只能在工作线程中调用。
+    """
+
+    def _reserve_tokens(self, messages) -> int:
+        return LLMScheduler.reserve_tokens(estimate_message_tokens(messages), self.kwargs.get("max_tokens"))
+
+    def _record_usage(self, messages, token_usage: Optional[Tuple[int, int]], output_text: str) -> int:
+        """记录 token 使用量，接口未返回 usage 时本地计数；返回总 token 数"""
+        if token_usage is not None:
+            (prompt, completion), estimated = token_usage, False
+        else:
+            prompt, completion, estimated = \
+                estimate_message_tokens(messages, counter=count_tokens), count_tokens(output_text), True
+        TokenUsageRecorder.record(self.model_id, prompt, completion, estimated, site="code_interpreter")
+        return prompt + completion
+
+    def generate(self, messages, *args, **kwargs):
+        with LLMScheduler.sync_slot(self.model_id, self._reserve_tokens(messages), LLMPriorityCtx.priority) as lease:
+            for attempt in range(LLMScheduler.retries + 1):
+                try:
+                    message = super().generate(messages, *args, **kwargs)
+                    content = message.content if isinstance(message.content, str) else ""
+                    usage = getattr(message, "token_usage", None)
+                    token_usage = (usage.input_tokens, usage.output_tokens) if usage is not None else None
+                    lease.settle(self._record_usage(messages, token_usage, content))
+                    return message
+                except Exception as e:
+                    if not is_rate_limited(e) or attempt >= LLMScheduler.retries:
+                        raise
+                    time.sleep(LLMScheduler.rate_limited(self.model_id, e))
+
+    def generate_stream(self, messages, *args, **kwargs):
+        with LLMScheduler.sync_slot(self.model_id, self._reserve_tokens(messages), LLMPriorityCtx.priority) as lease:
+            for attempt in range(LLMScheduler.retries + 1):
+                started, token_usage, output, finished = False, None, [], False
+                try:
+                    for event in super().generate_stream(messages, *args, **kwargs):
+                        started = True
+                        if (usage := getattr(event, "token_usage", None)) is not None:
+                            prompt, completion = token_usage or (0, 0)
+                            token_usage = (prompt + usage.input_tokens, completion + usage.output_tokens)
+                        if isinstance(getattr(event, "content", None), str):
+                            output.append(event.content)
+                        yield event
+                    finished = True
+                    return
+                except Exception as e:
+                    # 已经输出内容的流不重试
+                    if started or not is_rate_limited(e) or attempt >= LLMScheduler.retries:
+                        raise
+                    time.sleep(LLMScheduler.rate_limited(self.model_id, e))
+                finally:
+                    # 流中途失败或被关闭也计入已产生的使用量
+                    if started:
+                        used = self._record_usage(messages, token_usage, "".join(output))
+                        if finished:
+                            lease.settle(used)
+
+
 def create_ci_agent(
     prompt_templates=None,
     max_tokens: int = 16000,
     return_full_result: bool = True,
     output_dir: str = "",
 ) -> CIAgent:
-    model = LiteLLMModel(
+    model = ScheduledLiteLLMModel(
         max_tokens=max_tokens,
         model_id=os.getenv("CODE_INTEPRETER_MODEL","gpt-4.1")
     )
@@ -8,21 +8,57 @@
 import asyncio
 import json
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
 from functools import partial
-from typing import List, AsyncGenerator, Tuple
+from typing import Dict, List, AsyncGenerator, Tuple
 
 from genie_tool.util.log_util import logger
 from genie_tool.util.llm_util import ask_llm
 from genie_tool.model.document import Doc
 from genie_tool.util.log_util import timer
-from genie_tool.tool.search_component.query_process import query_decompose
+from genie_tool.tool.search_component.query_process import query_decompose, query_decompose_stream, rewrite_query
 from genie_tool.tool.search_component.answer import answer_question
 from genie_tool.tool.search_component.reasoning import search_reasoning
+from genie_tool.tool.search_component.near_dedup import NearDupIndex
+from genie_tool.tool.search_component.novelty import NoveltyTracker
+from genie_tool.tool.search_component.context_builder import ContextBuilder
 from genie_tool.tool.search_component.search_engine import MixSearch
 from genie_tool.model.protocal import StreamMode
-from genie_tool.util.file_util import truncate_files
-from genie_tool.model.context import LLMModelInfoFactory
+from genie_tool.model.context import LLMModelInfoFactory, LLMPriorityCtx
+
+
+async def _prefetch(chunks: AsyncGenerator[str, None], queue: asyncio.Queue):
+    """后台消费流式输出写入队列，结束时写入 None；任务取消时关闭生成器，取消传递到 ask_llm"""
+    try:
+        async for chunk in chunks:
+            queue.put_nowait(chunk)
+    finally:
+        await chunks.aclose()
+        queue.put_nowait(None)
+
+
+async def _drain(queue: asyncio.Queue, task: asyncio.Task) -> AsyncGenerator[str, None]:
+    """按顺序读出 _prefetch 的结果，生产端异常原样抛出；提前关闭时取消生产端"""
+    try:
+        while (chunk := await queue.get()) is not None:
+            yield chunk
+        await task
+    finally:
+        await _cancel(task)
+
+
+async def _cancel(task: asyncio.Task):
+    """取消并等待任务结束，确保底层流已关闭"""
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        if asyncio.current_task().cancelling():
+            raise
+    except Exception:
+        pass
 
 
 class DeepSearch:
@@ -39,14 +75,23 @@ class DeepSearch:
             MixSearch().search_and_dedup, use_bing=use_bing, use_jina=use_jina, use_sogou=use_sogou, use_serp=use_serp)
         self.searched_queries = []
         self.current_docs = []
+        self.dedup_index = NearDupIndex()
+        self.context_builder = ContextBuilder()
+        self._search_semaphore = asyncio.Semaphore(int(os.getenv("SEARCH_THREAD_NUM", 5)))
+        # 流式查询分解：每解析出一个子查询立即发起搜索
+        self._stream_decompose = os.getenv("DEEPSEARCH_STREAM_DECOMPOSE", "false") == "true"
+        self._speculative_answer = os.getenv("DEEPSEARCH_SPECULATIVE_ANSWER", "false") == "true"
+        self._novelty_stop = os.getenv("DEEPSEARCH_NOVELTY_STOP", "true") == "true"
 
-    def search_docs_str(self, model: str = None) -> str:
-        current_docs_str = ""
-        max_tokens = LLMModelInfoFactory.get_context_length(model)
-        truncate_docs = truncate_files(self.current_docs, max_tokens=int(max_tokens * 0.8)) if model else self.current_docs
-        for i, doc in enumerate(truncate_docs, start=1):
-            current_docs_str += f"文档编号〔{i}〕. \n{doc.to_html()}\n"
-        return current_docs_str
+    def search_docs_str(self, model: str = None, query: str = None) -> str:
+        """按 query 和已检索的子查询挑选最相关的段落装入 token 预算，文档编号固定为文档在 current_docs 中的序号"""
+        # 只增量加入上一次之后新增的文档
+        self.context_builder.append(self.current_docs[self.context_builder.doc_count:])
+        budget = int(os.getenv("SEARCH_CONTEXT_TOKEN_BUDGET", 30000))
+        if model:
+            context_budget = int(LLMModelInfoFactory.get_context_length(model) * 0.8)
+            budget = min(budget, context_budget) if budget > 0 else context_budget
+        return self.context_builder.build([query or ""] + self.searched_queries, budget=budget)
 
     @timer()
     async def run(
@@ -56,38 +101,85 @@ class DeepSearch:
             max_loop: int = 1,
             stream: bool = False,
             stream_mode: StreamMode = StreamMode(),
+            progressive: bool = None,
             *args,
             **kwargs
     ) -> AsyncGenerator[str, None]:
-        """深度搜索回复（流式）"""
+        """深度搜索回复（流式）
+
+        progressive 为 True 时每个子查询完成即推送 search_progress 消息，默认取 DEEPSEARCH_PROGRESSIVE；
+        DEEPSEARCH_SPECULATIVE_ANSWER 开启时在推理验证期间投机生成答案，验证需要继续搜索则取消，答案不会输出
+        """
+        if progressive is None:
+            progressive = os.getenv("DEEPSEARCH_PROGRESSIVE", "false") == "true"
+        # 交互式请求，LLM 调度优先于报告等批量任务
+        LLMPriorityCtx.priority = "interactive"
 
         current_loop = 1
+        answer_task, answer_queue = None, None
+        novelty = NoveltyTracker(query)
         # 执行深度搜索循环
         while current_loop <= max_loop:
             logger.info(f"{request_id} 第 {current_loop} 轮深度搜索...")
-            # 查询分解
-            sub_queries = await query_decompose(query=query)
+            # 查询分解，首轮可同时对原始查询及其改写做投机搜索
+            round_start = time.time()
+            started: Dict[str, asyncio.Task] = {}
+            speculative = self._start_speculative_search(query, request_id, round_start) if current_loop == 1 else {}
+            started.update(speculative)
+            try:
+                if self._stream_decompose:
+                    sub_queries = await self._decompose_and_dispatch(query, request_id, round_start, started)
+                else:
+                    sub_queries = await query_decompose(query=query, searched_queries=self.searched_queries)
+                decompose_end = time.time()
+                decomposed = list(sub_queries)
+                # 投机搜索的查询并入本轮子查询，文档与分解出的子查询一起合并去重
+                sub_queries += [q for q in speculative if q not in sub_queries]
 
-            yield json.dumps({
-                "requestId": request_id,
-                "query": query,
-                "searchResult": {"query": sub_queries, "docs": [[]] * len(sub_queries)},
-                "isFinal": False,
-                "messageType": "extend"
-            }, ensure_ascii=False)
+                yield json.dumps({
+                    "requestId": request_id,
+                    "query": query,
+                    "searchResult": {"query": sub_queries, "docs": [[]] * len(sub_queries)},
+                    "isFinal": False,
+                    "messageType": "extend"
+                }, ensure_ascii=False)
 
-            await asyncio.sleep(0.1)
+                await asyncio.sleep(0.1)
 
-            # 去除已经检索过的query
-            sub_queries = [sub_query for sub_query in sub_queries
-                           if sub_query not in self.searched_queries]
-            # 并行搜索并去重
-            searched_docs, docs_list = await self._search_queries_and_dedup(
-                queries=sub_queries,
-                request_id=request_id,
-            )
+                # 去除已经检索过的query
+                sub_queries = [sub_query for sub_query in sub_queries
+                               if sub_query not in self.searched_queries]
+                # 并行搜索，progressive 模式下每个子查询完成即推送一次 search_progress
+                truncate_len = int(os.getenv("SINGLE_PAGE_MAX_SIZE", 200))
+                docs_list: List[List[Doc]] = [[] for _ in sub_queries]
+                query_stats: List[dict] = [{} for _ in sub_queries]
+                async for index, docs, stat in self._iter_search_queries(
+                        queries=sub_queries, request_id=request_id, started=started, start_time=round_start):
+                    docs_list[index] = docs
+                    query_stats[index] = stat
+                    if progressive:
+                        yield json.dumps({
+                            "requestId": request_id,
+                            "query": query,
+                            "searchResult": {
+                                "query": sub_queries,
+                                "docs": [[d.to_dict(truncate_len=truncate_len) for d in docs_l] for docs_l in docs_list]
+                            },
+                            "subQueryIndex": index,
+                            "subQueryStat": stat,
+                            "isFinal": False,
+                            "messageType": "search_progress"
+                        }, ensure_ascii=False)
+            finally:
+                # 未被消费的提前发起的搜索（如生成器被关闭）一并取消
+                for task in started.values():
+                    task.cancel()
+            speculative_stat = self._speculative_stat(
+                speculative, decomposed, sub_queries, query_stats, round_start, decompose_end)
+            if speculative_stat:
+                logger.info(f"{request_id} speculative search stat: {speculative_stat}")
+            searched_docs = self._dedup_docs(docs_list, request_id)
 
-            truncate_len = int(os.getenv("SINGLE_PAGE_MAX_SIZE", 200))
             yield json.dumps(
                 {
                     "requestId": request_id,
@@ -96,6 +188,9 @@ class DeepSearch:
                         "query": sub_queries,
                         "docs": [[d.to_dict(truncate_len=truncate_len) for d in docs_l] for docs_l in docs_list]
                     },
+                    "subQueryStats": query_stats,
+                    "timeoutQueries": [q for q, stat in zip(sub_queries, query_stats) if stat.get("status") == "timeout"],
+                    "speculative": speculative_stat,
                     "isFinal": False,
                     "messageType": "search"
                 }, ensure_ascii=False)
@@ -103,32 +198,57 @@ class DeepSearch:
             # 更新上下文
             self.current_docs.extend(searched_docs)
             self.searched_queries.extend(sub_queries)
+            novelty_stat = novelty.update([doc for docs_l in docs_list for doc in docs_l])
+            logger.info(f"{request_id} loop {current_loop} information gain: {novelty_stat}")
 
             # 如果是最后一轮，直接跳出
             if current_loop == max_loop:
                 break
 
-            # 推理验证是否需要继续搜索
-            reasoning_result = search_reasoning(
-                request_id=request_id,
-                query=query,
-                content=self.search_docs_str(os.getenv("SEARCH_REASONING_MODEL")),
-            )
+            # 本轮新增内容很少时不再调用 reasoning，直接结束
+            if self._novelty_stop and novelty.should_stop(novelty_stat):
+                logger.info(f"{request_id} information gain below threshold, stop searching: {novelty.history}")
+                break
+
+            # 推理验证是否需要继续搜索，可同时投机生成答案
+            if self._speculative_answer:
+                answer_queue = asyncio.Queue()
+                answer_task = asyncio.create_task(_prefetch(answer_question(
+                    query=query, search_content=self.search_docs_str(os.getenv("SEARCH_ANSWER_MODEL"), query=query)
+                ), answer_queue))
+            try:
+                reasoning_result = await search_reasoning(
+                    request_id=request_id,
+                    query=query,
+                    content=self.search_docs_str(os.getenv("SEARCH_REASONING_MODEL"), query=query),
+                    history_query_list=self.searched_queries,
+                )
+            except BaseException:
+                await _cancel(answer_task)
+                raise
 
             # 如果推理判断已经可以回答，跳出循环
             if reasoning_result.get("is_verify", "1") in ["1", 1]:
                 logger.info(f"{request_id} reasoning 判断没有得到新的查询，流程结束")
+                if answer_task:
+                    logger.info(f"{request_id} use speculative answer, prefetched {answer_queue.qsize()} chunks")
                 break
 
+            # 需要继续搜索，丢弃投机生成的答案
+            if answer_task:
+                logger.info(f"{request_id} discard speculative answer, prefetched {answer_queue.qsize()} chunks")
+                await _cancel(answer_task)
+                answer_task = None
+
             current_loop += 1
 
         # 生成最终答案
         answer = ""
         acc_content = ""
         acc_token = 0
-        async for chunk in answer_question(
-                query=query, search_content=self.search_docs_str(os.getenv("SEARCH_ANSWER_MODEL"))
-        ):
+        answer_stream = _drain(answer_queue, answer_task) if answer_task else answer_question(
+            query=query, search_content=self.search_docs_str(os.getenv("SEARCH_ANSWER_MODEL"), query=query))
+        async for chunk in answer_stream:
             if stream:
                 if acc_token >= stream_mode.token:
                     yield json.dumps({
@@ -171,31 +291,138 @@ class DeepSearch:
                 "messageType": "report"
             }, ensure_ascii=False)
 
-    async def _search_queries_and_dedup(
+    async def _search_sub_query(
+            self,
+            sub_query: str,
+            request_id: str,
+            start_time: float,
+    ) -> Tuple[List[Doc], dict]:
+        """搜索单个子查询，返回 (文档, 耗时和状态)；超过 SEARCH_QUERY_TIMEOUT 秒记为 timeout，异常记为 error"""
+        query_timeout = float(os.getenv("SEARCH_QUERY_TIMEOUT", 0)) or None
+        async with self._search_semaphore:
+            search_start = time.time()
+            status, docs = "ok", []
+            timeout_cm = asyncio.timeout(query_timeout)
+            try:
+                async with timeout_cm:
+                    docs = await self._search_single_query(sub_query, request_id)
+            except TimeoutError as e:
+                # 只有本查询的总超时才记为 timeout，内部请求自身的超时记为 error
+                status = "timeout" if timeout_cm.expired() else "error"
+                logger.warning(f"{request_id} search query {status}: query={sub_query} timeout={query_timeout} "
+                               f"error={e!r}")
+            except Exception as e:
+                # 单个查询失败不影响其他查询
+                status = "error"
+                logger.warning(f"{request_id} search query error: query={sub_query} error={e!r}")
+            return docs, {
+                "status": status,
+                "docs": len(docs),
+                "costMs": int((time.time() - search_start) * 1000),
+                "elapsedMs": int((time.time() - start_time) * 1000),
+            }
+
+    async def _iter_search_queries(
             self,
             queries: List[str],
             request_id: str,
-    ) -> Tuple[List[Doc], List[List[Doc]]]:
-        """异步并行搜索多个查询并去重"""
-        def _run_async(*args, **kwargs):
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            s_result = loop.run_until_complete(self._search_single_query(*args, **kwargs))
-            loop.close()
-            return s_result
-
-        process_list = []
-        with ThreadPoolExecutor(max_workers=int(os.getenv("SEARCH_THREAD_NUM", 5))) as executor:
-            for query in queries:
-                process = executor.submit(_run_async, query, request_id)
-                process_list.append(process)
-        results = [process.result() for process in as_completed(process_list)]
-        all_docs = [doc for docs in results for doc in docs]
-        # 去重
-        seen_content = set()
-        deduped_docs = []
-        for doc in all_docs:
-            if doc.content and doc.content not in seen_content:
-                deduped_docs.append(doc)
-                seen_content.add(doc.content)
-        return deduped_docs, results
+            started: Dict[str, asyncio.Task] = None,
+            start_time: float = None,
+    ) -> AsyncGenerator[Tuple[int, List[Doc], dict], None]:
+        """在当前事件循环内并发搜索多个查询，按完成顺序产出 (查询下标, 文档, 耗时和状态)
+
+        started 为流式分解时已提前发起的搜索，直接复用；并发数由 SEARCH_THREAD_NUM 限制；
+        生成器关闭或被取消时取消未完成的搜索。
+        """
+        start_time = start_time or time.time()
+        started = started if started is not None else {}
+        tasks = {
+            (started.pop(q, None) or asyncio.create_task(self._search_sub_query(q, request_id, start_time))): i
+            for i, q in enumerate(queries)
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=tasks.get):
+                    yield (tasks[task], *task.result())
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _decompose_and_dispatch(
+            self,
+            query: str,
+            request_id: str,
+            start_time: float,
+            started: Dict[str, asyncio.Task],
+    ) -> List[str]:
+        """流式查询分解，每解析出一个未检索过的子查询立即发起搜索并记入 started，返回子查询"""
+        sub_queries, dispatched = [], 0
+        try:
+            async for sub_query in query_decompose_stream(query=query, searched_queries=self.searched_queries):
+                sub_queries.append(sub_query)
+                if sub_query in self.searched_queries or sub_query in started:
+                    continue
+                if not dispatched:
+                    logger.info(f"{request_id} first search dispatched after "
+                                f"{int((time.time() - start_time) * 1000)}ms: {sub_query}")
+                started[sub_query] = asyncio.create_task(self._search_sub_query(sub_query, request_id, start_time))
+                dispatched += 1
+        except BaseException:
+            for task in started.values():
+                task.cancel()
+            raise
+        logger.info(f"{request_id} query decompose finished after {int((time.time() - start_time) * 1000)}ms, "
+                    f"{dispatched} searches dispatched early")
+        return sub_queries
+
+    def _start_speculative_search(self, query: str, request_id: str, start_time: float) -> Dict[str, asyncio.Task]:
+        """查询分解期间先搜索原始查询及其改写，DEEPSEARCH_SPECULATIVE_SEARCH 关闭时返回空"""
+        if os.getenv("DEEPSEARCH_SPECULATIVE_SEARCH", "false") != "true":
+            return {}
+        queries = [query] + rewrite_query(query)[:int(os.getenv("DEEPSEARCH_SPECULATIVE_REWRITES", 1))]
+        speculative = {
+            q: asyncio.create_task(self._search_sub_query(q, request_id, start_time))
+            for q in dict.fromkeys(queries) if q and q not in self.searched_queries
+        }
+        logger.info(f"{request_id} speculative search: {list(speculative)}")
+        return speculative
+
+    @staticmethod
+    def _speculative_stat(
+            speculative: Dict[str, asyncio.Task],
+            decomposed: List[str],
+            sub_queries: List[str],
+            query_stats: List[dict],
+            start_time: float,
+            decompose_end: float,
+    ) -> dict:
+        """投机搜索节省的墙钟时间：本轮搜索完成时刻与不做投机时的预估完成时刻之差
+
+        只有与分解出的子查询一致的投机查询才算节省（否则不做投机时也不会搜索），
+        不做投机时这些查询在分解完成后才开始，耗时按实际搜索耗时估计。
+        """
+        if not speculative:
+            return {}
+        decompose_ms = int((decompose_end - start_time) * 1000)
+        stats = {q: stat for q, stat in zip(sub_queries, query_stats) if stat}
+        matched = [q for q in speculative if q in decomposed and q in stats]
+        saved_ms = 0
+        if matched:
+            actual_end = max(stat.get("elapsedMs", 0) for stat in stats.values())
+            baseline_end = max(
+                [decompose_ms + stats[q].get("costMs", 0) for q in matched]
+                + [stat.get("elapsedMs", 0) for q, stat in stats.items() if q not in speculative]
+            )
+            saved_ms = max(baseline_end - actual_end, 0)
+        return {"queries": list(speculative), "matchedQueries": matched, "decomposeMs": decompose_ms,
+                "savedMs": saved_ms}
+
+    def _dedup_docs(self, docs_list: List[List[Doc]], request_id: str) -> List[Doc]:
+        """按子查询顺序合并并去重"""
+        all_docs = [doc for docs in docs_list for doc in docs]
+        # 近似去重，索引跨轮次累积，已进入上下文的文档不会再次加入
+        deduped_docs = self.dedup_index.dedup(all_docs)
+        logger.info(f"{request_id} dedup docs: {len(all_docs)} -> {len(deduped_docs)} stats={self.dedup_index.stats}")
+        return deduped_docs
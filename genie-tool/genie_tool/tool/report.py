@@ -17,7 +17,7 @@ from genie_tool.util.file_util import download_all_files, truncate_files, flatte
 from genie_tool.util.prompt_util import get_prompt
 from genie_tool.util.llm_util import ask_llm
 from genie_tool.util.log_util import timer
-from genie_tool.model.context import LLMModelInfoFactory
+from genie_tool.model.context import LLMModelInfoFactory, LLMPriorityCtx
 
 load_dotenv()
 
@@ -35,6 +35,8 @@ async def report(
         "html": html_report,
     }
     model = os.getenv("REPORT_MODEL", "gpt-4.1")
+    # 批量任务，LLM 调度让位于深度搜索等交互式请求
+    LLMPriorityCtx.priority = "batch"
     async for chunk in report_factory[file_type](task, file_names, model):
         yield chunk
 
@@ -65,7 +67,8 @@ async def ppt_report(
         .render(task=task, files=truncate_flat_files, date=datetime.now().strftime("%Y-%m-%d"))
 
     async for chunk in ask_llm(messages=prompt, model=model, stream=True,
-                               temperature=temperature, top_p=top_p, only_content=True):
+                               temperature=temperature, top_p=top_p, only_content=True,
+                               cache_site="ppt_report"):
         yield chunk
 
 
@@ -91,7 +94,8 @@ async def markdown_report(
         .render(task=task, files=truncate_flat_files, current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
     async for chunk in ask_llm(messages=prompt, model=model, stream=True,
-                               temperature=temperature, top_p=top_p, only_content=True):
+                               temperature=temperature, top_p=top_p, only_content=True,
+                               cache_site="markdown_report"):
         yield chunk
 
 
@@ -145,7 +149,8 @@ async def html_report(
     async for chunk in ask_llm(
             messages=[{"role": "system", "content": report_prompts["html_prompt"]},
                       {"role": "user", "content": prompt}],
-            model=model, stream=True, temperature=temperature, top_p=top_p, only_content=True):
+            model=model, stream=True, temperature=temperature, top_p=top_p, only_content=True,
+            cache_site="html_report"):
         yield chunk
 
 
@@ -31,6 +31,7 @@ async def answer_question(query: str, search_content: str):
             model=model,
             stream=True,
             only_content=True,  # 只返回内容
+            cache_site="answer_question",
     ):
         if chunk:
             yield chunk
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import os
+from dataclasses import replace
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.passage_index import PassageIndex, join_passages
+from genie_tool.util.token_util import count_tokens
+
+
+class ContextBuilder(object):
+    """多轮深度搜索的增量上下文
+
+    每轮只切分、计数新加入的文档；文档渲染结果按所选段落缓存；
+    缓冲区超过 max_tokens 时按与查询的相关度淘汰低价值文档，使每轮开销不随轮数增长。
+    引用编号固定为文档加入顺序（从 1 开始），淘汰不影响其他文档编号。
+    """
+
+    def __init__(self, max_tokens: int = None, passage_size: int = None):
+        self.max_tokens = max_tokens if max_tokens is not None else int(
+            os.getenv("SEARCH_CONTEXT_BUFFER_MAX_TOKENS", 200000))
+        self.index = PassageIndex(passage_size=passage_size)
+        self._docs: Dict[int, Doc] = {}
+        # 文档编号、标题、链接等渲染开销
+        self._overhead: Dict[int, int] = {}
+        self._rendered: Dict[Tuple[int, Tuple[int, ...]], str] = {}
+        self.total_tokens = 0
+        self.stats = {"docs": 0, "evicted_docs": 0, "render_hit": 0, "render_miss": 0}
+
+    @property
+    def doc_count(self) -> int:
+        return self.index.doc_count
+
+    def append(self, docs: List[Doc]):
+        start, passage_start = self.index.doc_count, len(self.index.passages)
+        self.index.add_docs(docs)
+        for doc_index, doc in enumerate(docs, start=start):
+            self._docs[doc_index] = doc
+            self._overhead[doc_index] = count_tokens(f"{doc.title}{doc.link}") + 30
+        self.total_tokens += sum(p.tokens for p in self.index.passages[passage_start:])
+        self.stats["docs"] += len(docs)
+
+    def _evict(self, queries: List[str]):
+        """按文档最高段落得分从低到高淘汰，直到不超过 max_tokens"""
+        scores = self.index.scores(queries)
+        doc_value, doc_tokens = {}, {}
+        for passage, score in zip(self.index.passages, scores):
+            doc_value[passage.doc_index] = max(doc_value.get(passage.doc_index, 0.0), float(score))
+            doc_tokens[passage.doc_index] = doc_tokens.get(passage.doc_index, 0) + passage.tokens
+        evicted = set()
+        # 同分先淘汰较早加入的文档
+        for doc_index in sorted(doc_value, key=lambda i: (doc_value[i], i)):
+            if self.total_tokens <= self.max_tokens:
+                break
+            evicted.add(doc_index)
+            self.total_tokens -= doc_tokens[doc_index]
+        self.index.remove_docs(evicted)
+        for doc_index in evicted:
+            self._docs.pop(doc_index, None)
+            self._overhead.pop(doc_index, None)
+        self.stats["evicted_docs"] += len(evicted)
+        logger.info(f"context buffer evict docs: {len(evicted)} total_tokens={self.total_tokens}")
+
+    def _render(self, doc_index: int, passages, rendered: Dict[Tuple[int, Tuple[int, ...]], str]) -> str:
+        key = (doc_index, tuple(p.position for p in passages))
+        if key in self._rendered:
+            self.stats["render_hit"] += 1
+            rendered[key] = self._rendered[key]
+        else:
+            self.stats["render_miss"] += 1
+            doc = replace(self._docs[doc_index], content=join_passages(passages))
+            rendered[key] = f"文档编号〔{doc_index + 1}〕. \n{doc.to_html()}\n"
+        return rendered[key]
+
+    def build(self, queries: List[str], budget: int) -> str:
+        """挑选与 queries 最相关的段落装入 budget 个 token（<= 0 不限制）并渲染"""
+        if self.max_tokens > 0 and self.total_tokens > self.max_tokens:
+            self._evict(queries)
+        selected = self.index.select(queries, budget=budget, doc_overhead=self._overhead)
+        # 只保留本轮用到的渲染结果，下一轮选择不变的文档直接复用
+        rendered = {}
+        context = "".join(self._render(doc_index, selected[doc_index], rendered) for doc_index in sorted(selected))
+        self._rendered = rendered
+        return context
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from loguru import logger
+
+
+class _LatencyWindow(object):
+    """最近 N 次成功调用的耗时（秒）"""
+
+    def __init__(self, size: int):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+class _CircuitBreaker(object):
+    """熔断器：closed 正常 -> open 跳过该引擎 -> 冷却后 half_open 放行一次探测"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, window: int, min_calls: int, error_rate: float, consecutive_failures: int, cooldown: float):
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._min_calls = min_calls
+        self._error_rate = error_rate
+        self._consecutive_limit = consecutive_failures
+        self._cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._probe_at = 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return round(self._outcomes.count(False) / len(self._outcomes), 4) if self._outcomes else 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.time() - self.opened_at >= self._cooldown:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            # 探测请求可能被取消而没有结果，超过冷却时间后允许再次探测
+            if self._probing and time.time() - self._probe_at < self._cooldown:
+                return False
+            self._probing = True
+            self._probe_at = time.time()
+            return True
+        return self.state == self.CLOSED
+
+    def on_success(self):
+        self._outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.state != self.CLOSED:
+            self.state = self.CLOSED
+            self._outcomes.clear()
+            self._probing = False
+
+    def on_failure(self) -> bool:
+        """返回本次是否触发熔断"""
+        self._outcomes.append(False)
+        self.consecutive_failures += 1
+        tripped = self.state == self.HALF_OPEN or self.consecutive_failures >= self._consecutive_limit or (
+                len(self._outcomes) >= self._min_calls and self.error_rate >= self._error_rate)
+        if tripped and self.state != self.OPEN:
+            self.state = self.OPEN
+            self.opened_at = time.time()
+            self._probing = False
+            return True
+        return False
+
+
+class _EngineStats(object):
+    """各搜索引擎的实时耗时、错误率统计，提供熔断和自适应超时"""
+
+    def __init__(self):
+        self._window_size = int(os.getenv("SEARCH_ENGINE_STATS_WINDOW", 200))
+        self._min_samples = int(os.getenv("SEARCH_ENGINE_STATS_MIN_SAMPLES", 20))
+        self._ewma_alpha = float(os.getenv("SEARCH_ENGINE_EWMA_ALPHA", 0.2))
+        # 自适应超时 = clamp(p99 * factor, min, 配置的超时)
+        self._adaptive_timeout = os.getenv("SEARCH_ENGINE_ADAPTIVE_TIMEOUT", "true") == "true"
+        self._timeout_factor = float(os.getenv("SEARCH_ENGINE_TIMEOUT_FACTOR", 2.0))
+        self._timeout_min = float(os.getenv("SEARCH_ENGINE_TIMEOUT_MIN", 1.0))
+        self._breaker_enable = os.getenv("SEARCH_ENGINE_BREAKER_ENABLE", "true") == "true"
+        self._latency: Dict[str, _LatencyWindow] = {}
+        self._ewma: Dict[str, float] = {}
+        self._breakers: Dict[str, _CircuitBreaker] = {}
+
+    def _breaker(self, engine: str) -> _CircuitBreaker:
+        if engine not in self._breakers:
+            self._breakers[engine] = _CircuitBreaker(
+                window=int(os.getenv("SEARCH_ENGINE_BREAKER_WINDOW", 20)),
+                min_calls=int(os.getenv("SEARCH_ENGINE_BREAKER_MIN_CALLS", 10)),
+                error_rate=float(os.getenv("SEARCH_ENGINE_BREAKER_ERROR_RATE", 0.5)),
+                consecutive_failures=int(os.getenv("SEARCH_ENGINE_BREAKER_CONSECUTIVE_FAILURES", 5)),
+                cooldown=float(os.getenv("SEARCH_ENGINE_BREAKER_COOLDOWN", 30)),
+            )
+        return self._breakers[engine]
+
+    def record_latency(self, engine: str, latency: float):
+        self._latency.setdefault(engine, _LatencyWindow(self._window_size)).record(latency)
+        prev = self._ewma.get(engine)
+        self._ewma[engine] = latency if prev is None else self._ewma_alpha * latency + (1 - self._ewma_alpha) * prev
+
+    def record_success(self, engine: str, latency: float):
+        self.record_latency(engine, latency)
+        self._breaker(engine).on_success()
+
+    def record_failure(self, engine: str, error: BaseException = None):
+        if self._breaker(engine).on_failure():
+            logger.warning(f"search engine circuit open: engine={engine} error={error!r}")
+
+    def allow(self, engine: str) -> bool:
+        """熔断打开时返回 False，冷却后放行一次探测"""
+        return not self._breaker_enable or self._breaker(engine).allow()
+
+    def percentile(self, engine: str, p: float) -> Optional[float]:
+        """样本不足时返回 None"""
+        window = self._latency.get(engine)
+        if window is None or len(window) < self._min_samples:
+            return None
+        return window.percentile(p)
+
+    def timeout(self, engine: str, default: float) -> float:
+        """根据观测耗时推导的超时，不超过 default，样本不足时返回 default"""
+        p99 = self.percentile(engine, 0.99)
+        if not self._adaptive_timeout or p99 is None:
+            return default
+        return min(default, max(self._timeout_min, p99 * self._timeout_factor))
+
+    def metrics(self) -> dict:
+        engines = set(self._latency) | set(self._breakers)
+        return {
+            engine: {
+                "samples": len(self._latency.get(engine, ())),
+                "ewma": self._ewma.get(engine),
+                "p50": self._latency[engine].percentile(0.5) if engine in self._latency else None,
+                "p95": self._latency[engine].percentile(0.95) if engine in self._latency else None,
+                "p99": self._latency[engine].percentile(0.99) if engine in self._latency else None,
+                "error_rate": self._breaker(engine).error_rate,
+                "consecutive_failures": self._breaker(engine).consecutive_failures,
+                "breaker": self._breaker(engine).state,
+                "timeout": self.timeout(engine, float(os.getenv("SEARCH_TIMEOUT", 10))),
+            } for engine in engines
+        }
+
+
+EngineStats = _EngineStats()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import multiprocessing
+import os
+import pickle
+import re
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set, Union
+
+from bs4 import BeautifulSoup
+from loguru import logger
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# 非正文标签，整棵子树丢弃
+NOISE_TAGS = ["script", "style", "noscript", "template", "iframe", "svg", "canvas", "head"]
+# 常见的页面框架区域
+BOILERPLATE_TAGS = ["nav", "header", "footer", "aside", "form", "button", "select"]
+BOILERPLATE_PATTERN = re.compile(
+    r"(^|[\s_-])(nav|navbar|menu|footer|sidebar|breadcrumbs?|comments?|advert|ads?|share|social|cookie|copyright|related)($|[\s_-])",
+    re.IGNORECASE,
+)
+# 正文容器，即便 class/id 命中也不丢弃
+CONTENT_TAGS = {"html", "body", "main", "article"}
+
+
+def _normalize_text(lines) -> str:
+    return "\n".join(line for line in (re.sub(r"[ \t\r\f\v　\xa0]+", " ", l).strip() for l in lines) if line)
+
+
+def _extract_lxml(html: str) -> str:
+    root = lxml.html.fromstring(html)
+    for el in root.xpath("//" + " | //".join(NOISE_TAGS + BOILERPLATE_TAGS)):
+        el.drop_tree()
+    for el in root.xpath("//*[@class or @id]"):
+        if el.tag in CONTENT_TAGS or el.getparent() is None:
+            continue
+        if BOILERPLATE_PATTERN.search(f"{el.get('class', '')} {el.get('id', '')}"):
+            el.drop_tree()
+    return _normalize_text(root.itertext())
+
+
+def _extract_bs4(html: str) -> str:
+    soup = BeautifulSoup(html, "html.parser")
+    for el in soup(NOISE_TAGS + BOILERPLATE_TAGS):
+        el.decompose()
+    for el in soup.find_all(attrs={"class": True}) + soup.find_all(attrs={"id": True}):
+        if el.decomposed or el.name in CONTENT_TAGS:
+            continue
+        attrs = f"{' '.join(el.get('class') or [])} {el.get('id') or ''}"
+        if BOILERPLATE_PATTERN.search(attrs):
+            el.decompose()
+    return _normalize_text(soup.get_text("\n").splitlines())
+
+
+EXTRACTORS: Dict[str, Callable[[str], str]] = {"bs4": _extract_bs4}
+if lxml is not None:
+    EXTRACTORS["lxml"] = _extract_lxml
+# 无法序列化的后端（lambda、闭包等），进程池模式下改用线程执行
+THREAD_ONLY_EXTRACTORS: Set[Callable[[str], str]] = set()
+
+
+def register_extractor(name: str, func: Callable[[str], str]):
+    """注册自定义抽取后端，func 最好为模块级函数：进程池模式下函数本身会被序列化传给子进程"""
+    EXTRACTORS[name] = func
+    try:
+        pickle.dumps(func)
+    except Exception as e:
+        THREAD_ONLY_EXTRACTORS.add(func)
+        logger.warning(f"page extract backend {name} is not picklable, run it in threads instead of processes: {e!r}")
+    else:
+        THREAD_ONLY_EXTRACTORS.discard(func)
+
+
+def resolve_extractor(backend: Union[str, Callable[[str], str]] = "auto") -> Callable[[str], str]:
+    """后端名称解析为抽取函数，需在注册所在的进程中调用（子进程中没有父进程注册的后端）"""
+    if callable(backend):
+        return backend
+    if backend == "auto":
+        backend = "lxml" if "lxml" in EXTRACTORS else "bs4"
+    if backend not in EXTRACTORS:
+        logger.warning(f"unknown page extract backend: {backend}, fallback bs4")
+        return _extract_bs4
+    return EXTRACTORS[backend]
+
+
+def extract_text(html: str, backend: Union[str, Callable[[str], str]] = "auto") -> str:
+    """HTML 转正文，每个文档只解析一次；非 HTML 内容原样返回"""
+    if not html:
+        return ""
+    if "<" not in html[:1024]:
+        return html.strip()
+    extractor = resolve_extractor(backend)
+    try:
+        return extractor(html)
+    except Exception as e:
+        if extractor is _extract_bs4:
+            logger.warning(f"page extract failed: backend=bs4 error={e!r}")
+            return ""
+        logger.warning(f"page extract failed, fallback bs4: backend={getattr(extractor, '__name__', extractor)} "
+                       f"error={e!r}")
+        return _extract_bs4(html)
+
+
+class _PageExtractor(object):
+    """正文抽取阶段，运行在有界进程池中，避免阻塞事件循环
+
+    mode: process 进程池 / thread 线程池 / inline 事件循环内直接执行
+    """
+
+    def __init__(self):
+        self.mode = os.getenv("PAGE_EXTRACT_MODE", "process")
+        self.backend = os.getenv("PAGE_EXTRACT_BACKEND", "auto")
+        self._max_workers = int(os.getenv("PAGE_EXTRACT_WORKERS", 2))
+        self._max_pending = int(os.getenv("PAGE_EXTRACT_MAX_PENDING", 64))
+        self._executor: Optional[Executor] = None
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="page-extract")
+            else:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._max_workers, mp_context=multiprocessing.get_context("forkserver"))
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self._max_pending)
+        return self._semaphores[loop]
+
+    async def extract(self, html: str) -> str:
+        if not html:
+            return ""
+        # 在当前进程解析后端，把函数本身传给子进程
+        extractor = resolve_extractor(self.backend)
+        if self.mode == "inline":
+            return extract_text(html, extractor)
+        async with self._get_semaphore():
+            if self.mode != "thread" and extractor in THREAD_ONLY_EXTRACTORS:
+                return await asyncio.to_thread(extract_text, html, extractor)
+            executor = self._get_executor()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(executor, extract_text, html, extractor)
+            except BrokenExecutor as e:
+                # 进程池损坏（如子进程被 kill）时换一个新池，本次降级为线程执行，不阻塞事件循环
+                logger.warning(f"page extract pool broken, recreate and fallback to thread: {e!r}")
+                self._replace_executor(executor)
+                return await asyncio.to_thread(extract_text, html, extractor)
+            except Exception as e:
+                # 单个任务失败不影响进程池和其他任务
+                logger.warning(f"page extract task error, fallback to thread: {e!r}")
+                return await asyncio.to_thread(extract_text, html, extractor)
+
+    def _replace_executor(self, executor: Executor):
+        """丢弃损坏的进程池，不取消其他调用方仍在等待的任务；并发失败时只替换一次"""
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+PageExtractor = _PageExtractor()
+
+
+if __name__ == "__main__":
+    pass
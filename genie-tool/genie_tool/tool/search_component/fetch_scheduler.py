@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class _SchedulerState(object):
+    """单个事件循环内的调度状态"""
+
+    def __init__(self, global_limit: int, host_limit: int, host_interval: float):
+        self.global_limit = global_limit
+        self.host_limit = host_limit
+        self.host_interval = host_interval
+        self.running = 0
+        self.host_running: Dict[str, int] = defaultdict(int)
+        self.host_next_at: Dict[str, float] = {}
+        # request_id -> [(priority, seq, host, future)]，按请求轮转保证公平
+        self.queues: OrderedDict[str, List[Tuple[int, int, str, asyncio.Future]]] = OrderedDict()
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"scheduled": 0, "queued_ms": 0.0, "max_queued_ms": 0.0}
+
+    def push(self, request_id: str, priority: int, seq: int, host: str, future: asyncio.Future):
+        heapq.heappush(self.queues.setdefault(request_id, []), (priority, seq, host, future))
+        self.dispatch()
+
+    def release(self, host: str):
+        self.running -= 1
+        self.host_running[host] -= 1
+        if self.host_running[host] <= 0:
+            self.host_running.pop(host, None)
+        self.dispatch()
+
+    def _host_ready(self, host: str, now: float) -> bool:
+        return self.host_running.get(host, 0) < self.host_limit and self.host_next_at.get(host, 0) <= now
+
+    def _pick(self, now: float) -> Optional[Tuple[str, Tuple[int, int, str, asyncio.Future]]]:
+        for request_id in list(self.queues):
+            heap = self.queues[request_id]
+            # 丢弃已取消的等待者
+            heap[:] = [item for item in heap if not item[3].done()]
+            heapq.heapify(heap)
+            if not heap:
+                self.queues.pop(request_id)
+                continue
+            for item in sorted(heap):
+                if self._host_ready(item[2], now):
+                    heap.remove(item)
+                    heapq.heapify(heap)
+                    # 轮转到队尾，下一个槽位优先给其他请求
+                    self.queues.move_to_end(request_id)
+                    return request_id, item
+        return None
+
+    def dispatch(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        while self.running < self.global_limit:
+            picked = self._pick(now)
+            if picked is None:
+                break
+            _, (_, _, host, future) = picked
+            self.running += 1
+            self.host_running[host] += 1
+            if self.host_interval > 0:
+                self.host_next_at[host] = now + self.host_interval
+            future.set_result(None)
+        self.host_next_at = {h: t for h, t in self.host_next_at.items() if t > now}
+        # 仅因访问间隔受限的任务，到点后再调度一次
+        if self.running < self.global_limit and self.queues and self.timer is None and self.host_next_at:
+            self.timer = loop.call_at(min(self.host_next_at.values()), self._on_timer)
+
+    def _on_timer(self):
+        self.timer = None
+        self.dispatch()
+
+
+class _FetchScheduler(object):
+    """网页抓取调度：全局并发上限、单 host 并发上限与访问间隔、按排名优先、请求间轮转公平"""
+
+    def __init__(self):
+        self._global_limit = int(os.getenv("PAGE_FETCH_CONCURRENCY", 64))
+        self._host_limit = int(os.getenv("PAGE_FETCH_HOST_CONCURRENCY", 4))
+        self._host_interval = float(os.getenv("PAGE_FETCH_HOST_INTERVAL_MS", 0)) / 1000
+        self._states: Dict[asyncio.AbstractEventLoop, _SchedulerState] = {}
+        self._seq = itertools.count()
+
+    def _state(self) -> _SchedulerState:
+        loop = asyncio.get_running_loop()
+        if loop not in self._states:
+            for stale_loop in [l for l in self._states if l.is_closed()]:
+                self._states.pop(stale_loop, None)
+            self._states[loop] = _SchedulerState(self._global_limit, self._host_limit, self._host_interval)
+        return self._states[loop]
+
+    @asynccontextmanager
+    async def slot(self, url: str, priority: int = 0, request_id: str = None):
+        """获取抓取槽位，priority 越小越先执行（一般为搜索结果排名）"""
+        state = self._state()
+        host = (urlsplit(url).hostname or "").lower()
+        future = asyncio.get_running_loop().create_future()
+        start = time.time()
+        state.push(request_id or "", priority, next(self._seq), host, future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                state.release(host)
+            raise
+        queued_ms = (time.time() - start) * 1000
+        state.stats["scheduled"] += 1
+        state.stats["queued_ms"] += queued_ms
+        state.stats["max_queued_ms"] = max(state.stats["max_queued_ms"], queued_ms)
+        try:
+            yield
+        finally:
+            state.release(host)
+
+    def metrics(self) -> dict:
+        running = sum(s.running for s in self._states.values())
+        waiting = sum(len(q) for s in self._states.values() for q in s.queues.values())
+        scheduled = sum(s.stats["scheduled"] for s in self._states.values())
+        queued_ms = sum(s.stats["queued_ms"] for s in self._states.values())
+        return {
+            "global_limit": self._global_limit,
+            "host_limit": self._host_limit,
+            "running": running,
+            "waiting": waiting,
+            "scheduled": scheduled,
+            "avg_queued_ms": round(queued_ms / scheduled, 2) if scheduled else 0.0,
+            "max_queued_ms": round(max((s.stats["max_queued_ms"] for s in self._states.values()), default=0.0), 2),
+        }
+
+
+FetchScheduler = _FetchScheduler()
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import hashlib
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from genie_tool.model.document import Doc
+
+_NOISE_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def shingles(text: str, k: int = 4, max_chars: int = 20000) -> Counter:
+    """字符级 k-gram，去掉空白和标点，中英文通用"""
+    text = _NOISE_PATTERN.sub("", text[:max_chars].lower())
+    if len(text) <= k:
+        return Counter([text]) if text else Counter()
+    return Counter(text[i: i + k] for i in range(len(text) - k + 1))
+
+
+def simhash(text: str, k: int = 4, max_chars: int = 20000) -> Optional[int]:
+    """64 位 SimHash，按 shingle 出现次数加权；没有可用字符（如全是标点空白）时返回 None"""
+    grams = shingles(text, k=k, max_chars=max_chars)
+    if not grams:
+        return None
+    hashes = np.frombuffer(
+        b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams), dtype=">u8")
+    weights = np.fromiter(grams.values(), dtype=np.int64, count=len(grams))
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1).astype(np.int64)
+    votes = ((bits * 2 - 1) * weights[:, None]).sum(axis=0)
+    return int("".join("1" if v > 0 else "0" for v in votes), 2)
+
+
+class NearDupIndex(object):
+    """SimHash 近似去重索引，可跨多轮增量添加
+
+    汉明距离 <= threshold 视为重复；按鸽巢原理把 64 位切成 threshold+1 段建倒排，
+    只和至少一段完全相同的指纹比较。过短、没有指纹的文本或 threshold < 0 时退化为精确匹配。
+    """
+
+    BITS = 64
+
+    def __init__(self, threshold: int = None, shingle_size: int = None, min_length: int = None):
+        self.threshold = threshold if threshold is not None else int(os.getenv("NEAR_DEDUP_THRESHOLD", 3))
+        self.shingle_size = shingle_size or int(os.getenv("NEAR_DEDUP_SHINGLE_SIZE", 4))
+        self.min_length = min_length if min_length is not None else int(os.getenv("NEAR_DEDUP_MIN_LENGTH", 100))
+        self._bands = self._band_ranges(self.threshold + 1)
+        self._index: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self._exact: Set[str] = set()
+        self.stats = {"added": 0, "exact_dup": 0, "near_dup": 0}
+
+    def _band_ranges(self, n: int) -> List[Tuple[int, int]]:
+        n = max(1, min(n, self.BITS))
+        size, extra = divmod(self.BITS, n)
+        ranges, start = [], 0
+        for i in range(n):
+            end = start + size + (1 if i < extra else 0)
+            ranges.append((start, end))
+            start = end
+        return ranges
+
+    def _band_keys(self, fingerprint: int):
+        for i, (start, end) in enumerate(self._bands):
+            yield i, (fingerprint >> start) & ((1 << (end - start)) - 1)
+
+    def _near(self, fingerprint: int) -> bool:
+        for key in self._band_keys(fingerprint):
+            for other in self._index.get(key, ()):
+                if (fingerprint ^ other).bit_count() <= self.threshold:
+                    return True
+        return False
+
+    def add(self, content: str) -> bool:
+        """未重复时加入索引并返回 True，重复返回 False"""
+        if not content:
+            return False
+        if content in self._exact:
+            self.stats["exact_dup"] += 1
+            return False
+        fingerprint = simhash(content, k=self.shingle_size) \
+            if self.threshold >= 0 and len(content) >= self.min_length else None
+        if fingerprint is not None:
+            if self._near(fingerprint):
+                self.stats["near_dup"] += 1
+                return False
+            for key in self._band_keys(fingerprint):
+                self._index[key].append(fingerprint)
+        self._exact.add(content)
+        self.stats["added"] += 1
+        return True
+
+    def dedup(self, docs: List[Doc]) -> List[Doc]:
+        """保持原顺序，过滤空内容和与已有文档近似重复的文档"""
+        return [doc for doc in docs if self.add(doc.content)]
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import os
+from typing import List
+
+from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.near_dedup import NearDupIndex
+from genie_tool.tool.search_component.passage_index import split_passages, tokenize
+
+
+class NoveltyTracker(object):
+    """每轮搜索的信息增益：新增近似唯一段落占比 + 查询词覆盖率提升
+
+    两项都低于阈值时认为继续搜索收益很低，可以不调用 search_reasoning 直接结束。
+    """
+
+    def __init__(self, query: str, min_novelty: float = None, min_coverage_gain: float = None):
+        self.min_novelty = min_novelty if min_novelty is not None else float(
+            os.getenv("DEEPSEARCH_MIN_NOVELTY", 0.15))
+        self.min_coverage_gain = min_coverage_gain if min_coverage_gain is not None else float(
+            os.getenv("DEEPSEARCH_MIN_COVERAGE_GAIN", 0.02))
+        self.passage_size = int(os.getenv("SEARCH_PASSAGE_SIZE", 600))
+        self.query_terms = set(tokenize(query))
+        self._covered = set()
+        self._passages = NearDupIndex()
+        self.history: List[dict] = []
+
+    @property
+    def coverage(self) -> float:
+        return len(self._covered) / len(self.query_terms) if self.query_terms else 1.0
+
+    def update(self, docs: List[Doc]) -> dict:
+        """docs 为本轮抓取到的全部文档（去重前），返回本轮增益"""
+        passages = [p for doc in docs for p in split_passages(doc.content, self.passage_size)]
+        new_passages = sum(self._passages.add(p) for p in passages)
+        coverage_before = self.coverage
+        for doc in docs:
+            self._covered |= self.query_terms & set(tokenize(f"{doc.title} {doc.content}"))
+        stat = {
+            "loop": len(self.history) + 1,
+            "passages": len(passages),
+            "new_passages": new_passages,
+            "novelty": round(new_passages / len(passages), 4) if passages else 0.0,
+            "coverage": round(self.coverage, 4),
+            "coverage_gain": round(self.coverage - coverage_before, 4),
+        }
+        self.history.append(stat)
+        return stat
+
+    def should_stop(self, stat: dict) -> bool:
+        """首轮不判断；新增段落占比和覆盖率提升都低于阈值时返回 True"""
+        return stat["loop"] > 1 and stat["novelty"] < self.min_novelty and stat["coverage_gain"] < self.min_coverage_gain
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from genie_tool.util.cache_util import SqliteTTLCache
+
+
+def parse_domain_ttl(policy: str) -> Dict[str, int]:
+    """解析域名 TTL 策略，格式: "news.qq.com:600,wikipedia.org:86400" """
+    domain_ttl = {}
+    for item in (policy or "").split(","):
+        if ":" not in item:
+            continue
+        domain, ttl = item.rsplit(":", 1)
+        try:
+            domain_ttl[domain.strip().lower().lstrip(".")] = int(ttl)
+        except ValueError:
+            logger.warning(f"invalid page cache domain ttl: {item}")
+    return domain_ttl
+
+
+class _PageContentCache(object):
+    """网页正文缓存：url -> 抽取后的正文 + ETag/Last-Modified
+
+    新鲜期内直接返回；过期后携带校验头做条件请求，304 时续期复用。
+    磁盘记录保留 max_stale 秒用于再校验，按条数和总字节数 LRU 淘汰。
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PAGE_CACHE_ENABLE", "true") == "true"
+        self._default_ttl = int(os.getenv("PAGE_CACHE_TTL", 3600))
+        self._domain_ttl = parse_domain_ttl(os.getenv("PAGE_CACHE_DOMAIN_TTL", ""))
+        self._backend = SqliteTTLCache(
+            path=os.getenv("PAGE_CACHE_PATH", ".cache/page_cache.db"),
+            table="page_content",
+            max_size=int(os.getenv("PAGE_CACHE_MAX_SIZE", 50000)),
+            max_bytes=int(os.getenv("PAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024)),
+            ttl=int(os.getenv("PAGE_CACHE_MAX_STALE", 7 * 24 * 3600)),
+        )
+        self.stats = {"fresh_hit": 0, "revalidated": 0, "fetched": 0}
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, url: str) -> int:
+        """按域名后缀匹配 TTL，匹配最长的后缀"""
+        host = (urlsplit(url).hostname or "").lower()
+        best, best_len = self._default_ttl, -1
+        for domain, ttl in self._domain_ttl.items():
+            if (host == domain or host.endswith(f".{domain}")) and len(domain) > best_len:
+                best, best_len = ttl, len(domain)
+        return best
+
+    def is_fresh(self, url: str, entry: dict) -> bool:
+        return time.time() - entry.get("fetched_at", 0) < self.ttl_for(url)
+
+    @staticmethod
+    def conditional_headers(entry: Optional[dict]) -> dict:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    async def get(self, url: str) -> Optional[dict]:
+        try:
+            value = await self._backend.aget(self.key(url))
+        except Exception as e:
+            logger.warning(f"page cache get error: url=[{url}] error={e}")
+            return None
+        return json.loads(value) if value else None
+
+    async def set(self, url: str, text: str, etag: str = None, last_modified: str = None):
+        entry = {"text": text, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}
+        try:
+            await self._backend.aset(self.key(url), json.dumps(entry, ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"page cache set error: url=[{url}] error={e}")
+
+    async def touch(self, url: str, entry: dict):
+        """304 后续期"""
+        await self.set(url, entry["text"], entry.get("etag"), entry.get("last_modified"))
+
+    def metrics(self) -> dict:
+        total = sum(self.stats.values())
+        saved = self.stats["fresh_hit"] + self.stats["revalidated"]
+        return {
+            "enabled": self.enabled,
+            **self.stats,
+            "saved_ratio": round(saved / total, 4) if total else 0.0,
+            "backend": self._backend.metrics(),
+        }
+
+
+PageContentCache = _PageContentCache()
+
+
+if __name__ == "__main__":
+    pass
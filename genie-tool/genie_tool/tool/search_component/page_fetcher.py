@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import codecs
+import os
+import re
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+from genie_tool.tool.search_component.extractor import PageExtractor
+from genie_tool.tool.search_component.fetch_scheduler import FetchScheduler
+from genie_tool.tool.search_component.page_cache import PageContentCache
+from genie_tool.util.http_util import HttpClientPool
+from genie_tool.util.singleflight import SingleFlight
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+PARSE_CONTENT_TYPES = [
+    "text/html", "text/plain", "text/xml", "application/json", "application/xml", "application/octet-stream"]
+
+META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_\-]+)""", re.IGNORECASE)
+# 估算可见文本时去掉的部分
+INVISIBLE_PATTERN = re.compile(r"<(script|style)\b.*?</\1\s*>|<[^>]*>", re.IGNORECASE | re.DOTALL)
+# 老的 GB 编码统一按超集解码
+CHARSET_ALIAS = {"gb2312": "gb18030", "gbk": "gb18030", "x-gbk": "gb18030"}
+
+PAGE_FETCH_SINGLEFLIGHT_ENABLE = os.getenv("PAGE_FETCH_SINGLEFLIGHT_ENABLE", "true") == "true"
+PageFetchFlight = SingleFlight("page_fetch")
+
+
+def _normalize_charset(charset: Optional[str]) -> Optional[str]:
+    if not charset:
+        return None
+    charset = CHARSET_ALIAS.get(charset.strip().lower(), charset.strip().lower())
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return None
+
+
+def detect_charset(head: bytes, header_charset: Optional[str] = None) -> str:
+    """依次使用 响应头 -> BOM -> <meta charset> -> utf-8 试解码 -> charset_normalizer -> gb18030"""
+    if charset := _normalize_charset(header_charset):
+        return charset
+    for bom, charset in [(codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")]:
+        if head.startswith(bom):
+            return charset
+    if (matcher := META_CHARSET_PATTERN.search(head[:4096])) and (
+            charset := _normalize_charset(matcher.group(1).decode("ascii", errors="ignore"))):
+        return charset
+    try:
+        codecs.getincrementaldecoder("utf-8")(errors="strict").decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if charset_normalizer is not None and (best := charset_normalizer.from_bytes(head).best()):
+        return _normalize_charset(best.encoding) or "gb18030"
+    return "gb18030"
+
+
+async def read_text_capped(
+        response: aiohttp.ClientResponse,
+        max_bytes: int,
+        text_target: int = 0,
+        chunk_size: int = 16 * 1024,
+) -> str:
+    """流式读取并增量解码响应体
+
+    超过 max_bytes 或估算的可见文本达到 text_target 时提前结束并断开连接，
+    单页内存占用不超过 max_bytes；两者为 0 时不限制。
+    """
+    decoder = None
+    head = b""
+    parts = []
+    total_bytes = 0
+    visible_chars = 0
+    truncated = False
+    async for chunk in response.content.iter_chunked(chunk_size):
+        if 0 < max_bytes < total_bytes + len(chunk):
+            chunk = chunk[: max_bytes - total_bytes]
+            truncated = True
+        total_bytes += len(chunk)
+        if decoder is None:
+            # 编码探测需要一点样本
+            head += chunk
+            if len(head) < 4096 and not truncated:
+                continue
+            decoder = codecs.getincrementaldecoder(detect_charset(head, response.charset))(errors="replace")
+            chunk, head = head, b""
+        text = decoder.decode(chunk)
+        parts.append(text)
+        if text_target > 0:
+            visible_chars += len(INVISIBLE_PATTERN.sub("", text).strip())
+            if visible_chars >= text_target:
+                truncated = True
+        if truncated:
+            break
+    if decoder is None:
+        decoder = codecs.getincrementaldecoder(detect_charset(head, response.charset))(errors="replace")
+        parts.append(decoder.decode(head))
+    parts.append(decoder.decode(b"", final=True))
+    if truncated:
+        # 未读完的连接不能复用，直接关闭
+        response.close()
+        logger.info(f"page fetch truncated: url=[{response.url}] bytes={total_bytes}")
+    return "".join(parts)
+
+
+async def fetch_page_text(source_url: str, timeout: int = 10, priority: int = 0, request_id: str = None) -> str:
+    """抓取网页并抽取正文，同一 URL 的并发抓取合并为一次"""
+    if not PAGE_FETCH_SINGLEFLIGHT_ENABLE:
+        return await _fetch_page_text(source_url, timeout, priority, request_id)
+    return await PageFetchFlight.do(
+        source_url, lambda: _fetch_page_text(source_url, timeout, priority, request_id))
+
+
+async def _fetch_page_text(source_url: str, timeout: int = 10, priority: int = 0, request_id: str = None) -> str:
+    """带正文缓存和条件请求再校验；实际网络请求经 FetchScheduler 排队"""
+    entry = await PageContentCache.get(source_url) if PageContentCache.enabled else None
+    if entry and PageContentCache.is_fresh(source_url, entry):
+        PageContentCache.stats["fresh_hit"] += 1
+        return entry["text"]
+    session = HttpClientPool.get_session()
+    try:
+        async with FetchScheduler.slot(source_url, priority=priority, request_id=request_id):
+            async with session.get(
+                    source_url, timeout=timeout, headers=PageContentCache.conditional_headers(entry)) as response:
+                if response.status == 304 and entry:
+                    PageContentCache.stats["revalidated"] += 1
+                    await PageContentCache.touch(source_url, entry)
+                    return entry["text"]
+                if response.content_type.lower() not in PARSE_CONTENT_TYPES:
+                    # TODO 其他类型暂时不解析
+                    logger.warning(f"parser content-type[{response.content_type}] not parser: url=[{source_url}]")
+                    return ""
+                html = await read_text_capped(
+                    response,
+                    max_bytes=int(os.getenv("PAGE_FETCH_MAX_BYTES", 2 * 1024 * 1024)),
+                    text_target=int(os.getenv("PAGE_FETCH_TEXT_TARGET", 50000)),
+                )
+                status, headers = response.status, response.headers
+        # 释放抓取槽位后再做正文抽取
+        text = await PageExtractor.extract(html)
+        PageContentCache.stats["fetched"] += 1
+        if text and PageContentCache.enabled and status == 200:
+            await PageContentCache.set(source_url, text, headers.get("ETag"), headers.get("Last-Modified"))
+        return text
+    except Exception as e:
+        logger.warning(f"parser error: url=[{source_url}] error={e}")
+        # 网络异常时退回过期缓存
+        return entry["text"] if entry else ""
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Set
+
+import numpy as np
+
+from genie_tool.model.document import Doc
+from genie_tool.util.token_util import count_tokens
+
+# 英文/数字按单词，连续中文按二元组
+_TERM_PATTERN = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]+", re.IGNORECASE)
+# 句子切分：保留结尾标点
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;\n]+[。！？!?；;\n]*|[。！？!?；;\n]+")
+
+
+def tokenize(text: str) -> List[str]:
+    terms = []
+    for token in _TERM_PATTERN.findall(text.lower()):
+        if token[0] >= "\u4e00" and len(token) > 1:
+            terms.extend(token[i: i + 2] for i in range(len(token) - 1))
+        else:
+            terms.append(token)
+    return terms
+
+
+def split_passages(text: str, size: int) -> List[str]:
+    """按句子边界把正文切成不超过 size 字符的段落，超长句子硬切"""
+    passages, current = [], ""
+    for sentence in _SENTENCE_PATTERN.findall(text or ""):
+        while len(sentence) > size:
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(sentence[:size])
+            sentence = sentence[size:]
+        if len(current) + len(sentence) > size:
+            passages.append(current)
+            current = ""
+        current += sentence
+    if current.strip():
+        passages.append(current)
+    return [p for p in passages if p.strip()]
+
+
+@dataclass
+class Passage:
+    """文档片段，doc_index 为文档在上下文中的下标（引用编号 = doc_index + 1）"""
+    doc_index: int
+    position: int
+    text: str
+    tokens: int
+    terms: Counter
+
+
+class PassageIndex(object):
+    """段落索引：文档切段后按 BM25 对主查询和子查询打分，在 token 预算内挑选最相关的段落
+
+    文档只在加入时切分一次，可跨多轮增量添加。
+    """
+
+    def __init__(self, passage_size: int = None, k1: float = 1.5, b: float = 0.75):
+        self.passage_size = passage_size or int(os.getenv("SEARCH_PASSAGE_SIZE", 600))
+        self.k1 = k1
+        self.b = b
+        self.passages: List[Passage] = []
+        self.doc_count = 0
+        # 查询词在各段落的词频列和段落长度，随新增段落增量扩展
+        self._columns: Dict[str, np.ndarray] = {}
+        self._lengths = np.zeros(0, dtype=np.float32)
+
+    def add_docs(self, docs: List[Doc]):
+        for doc in docs:
+            title_terms = Counter(tokenize(doc.title or ""))
+            for position, text in enumerate(split_passages(doc.content, self.passage_size)):
+                # 标题词计入每个段落，命中标题的文档整体加权
+                self.passages.append(Passage(
+                    doc_index=self.doc_count, position=position, text=text, tokens=count_tokens(text),
+                    terms=Counter(tokenize(text)) + title_terms,
+                ))
+            self.doc_count += 1
+
+    def remove_docs(self, doc_indices: Set[int]):
+        """移除文档的全部段落，doc_count 不变，其余文档编号不受影响"""
+        keep = np.fromiter((p.doc_index not in doc_indices for p in self.passages), dtype=bool,
+                           count=len(self.passages))
+        self.passages = [p for p, k in zip(self.passages, keep) if k]
+        self._lengths = self._lengths[keep[:len(self._lengths)]]
+        self._columns = {t: c[keep[:len(c)]] for t, c in self._columns.items()}
+
+    def _term_column(self, term: str) -> np.ndarray:
+        column = self._columns.get(term, np.zeros(0, dtype=np.float32))
+        if len(column) < len(self.passages):
+            column = np.concatenate([column, np.fromiter(
+                (p.terms.get(term, 0) for p in self.passages[len(column):]), dtype=np.float32)])
+            self._columns[term] = column
+        return column
+
+    def _passage_lengths(self) -> np.ndarray:
+        if len(self._lengths) < len(self.passages):
+            self._lengths = np.concatenate([self._lengths, np.fromiter(
+                (sum(p.terms.values()) for p in self.passages[len(self._lengths):]), dtype=np.float32)])
+        return self._lengths
+
+    def scores(self, queries: List[str]) -> np.ndarray:
+        """每个段落的得分 = 主查询归一化 BM25 + 子查询中最高的归一化 BM25"""
+        query_terms = [list(dict.fromkeys(tokenize(q))) for q in queries if q]
+        vocab = {t: i for i, t in enumerate(dict.fromkeys(t for terms in query_terms for t in terms))}
+        if not self.passages or not vocab:
+            return np.zeros(len(self.passages))
+        tf = np.stack([self._term_column(term) for term in vocab], axis=1)
+        lengths = self._passage_lengths()
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (len(self.passages) - df + 0.5) / (df + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        bm25 = idf * tf * (self.k1 + 1) / (tf + norm[:, None])
+
+        per_query = []
+        for terms in query_terms:
+            score = bm25[:, [vocab[t] for t in terms]].sum(axis=1) if terms else np.zeros(len(self.passages))
+            per_query.append(score / score.max() if score.max() > 0 else score)
+        main, subs = per_query[0], per_query[1:]
+        return main + np.max(subs, axis=0) if subs else main
+
+    def select(self, queries: List[str], budget: int, doc_overhead: Dict[int, int] = None) -> Dict[int, List[Passage]]:
+        """按得分贪心装箱，budget <= 0 表示不限制；同分按文档和段落原顺序
+
+        doc_overhead 为每篇文档渲染标题、链接等的额外 token，首次选中该文档时计入预算。
+        返回 {doc_index: 按原顺序排列的段落}
+        """
+        scores = self.scores(queries)
+        order = sorted(range(len(self.passages)), key=lambda i: (-scores[i], i))
+        selected: Dict[int, List[Passage]] = {}
+        used = 0
+        for i in order:
+            passage = self.passages[i]
+            cost = passage.tokens
+            if passage.doc_index not in selected and doc_overhead:
+                cost += doc_overhead.get(passage.doc_index, 0)
+            if budget > 0 and used + cost > budget:
+                continue
+            selected.setdefault(passage.doc_index, []).append(passage)
+            used += cost
+        return {doc_index: sorted(passages, key=lambda p: p.position) for doc_index, passages in selected.items()}
+
+
+def join_passages(passages: List[Passage]) -> str:
+    """相邻段落直接拼接，不相邻的用省略号隔开"""
+    content = ""
+    for prev, passage in zip([None] + passages[:-1], passages):
+        if prev is not None and passage.position != prev.position + 1:
+            content += " …… "
+        content += passage.text
+    return content
+
+
+if __name__ == "__main__":
+    pass
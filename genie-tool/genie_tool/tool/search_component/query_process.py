@@ -8,6 +8,7 @@
 import os
 import re
 import time
+from typing import AsyncGenerator, List, Optional
 
 from loguru import logger
 
@@ -17,51 +18,124 @@ from genie_tool.model.context import RequestIdCtx
 from genie_tool.util.log_util import timer
 
 
-@timer()
-async def query_decompose(
-        query: str,
-        **kwargs
-):
-    model = os.getenv("QUERY_DECOMPOSE_MODEL", "gpt-4.1")
-    think_model = os.getenv("QUERY_DECOMPOSE_THINK_MODEL", "gpt-4.1")
-    current_date = time.strftime("%Y-%m-%d", time.localtime())
-    decompose_prompt = get_prompt("deepsearch")
-    # think
+QUERY_LINE_PATTERN = re.compile(r"^- (.+)$")
+# 口语化前缀和疑问语气，去掉后更接近搜索关键词
+# 单字"请"及"搜索/查询/麻烦"常是正文词语的开头（请假、搜索引擎、查询优化器），只在后面紧跟空白或标点时去掉
+QUERY_PREFIX_PATTERN = re.compile(
+    r"^((请问|请帮我|帮我(?!们)|麻烦(你|您)?帮我|麻烦(你|您)|我想知道|我想了解|想问一下|搜索一下|搜一下|查询一下|查一下)[\s,，:：]*"
+    r"|(请|搜索|查询|麻烦)[\s,，:：]+"
+    r"|(please\s+)?(tell me|search( for)?)\s+)+",
+    re.IGNORECASE,
+)
+QUERY_SUFFIX_PATTERN = re.compile(r"(是什么|是啥|有哪些|怎么样|吗|呢|呀|啊)?[\s?？!！。.~]*$")
+
+
+def rewrite_query(query: str) -> List[str]:
+    """原始查询的简单改写（不调用模型）：去掉口语化前缀、疑问语气和标点"""
+    query = query.strip()
+    rewritten = QUERY_SUFFIX_PATTERN.sub("", QUERY_PREFIX_PATTERN.sub("", query)).strip()
+    return [rewritten] if rewritten and rewritten != query else []
+
+
+async def _iter_query_lines(chunks: AsyncGenerator[str, None]) -> AsyncGenerator[str, None]:
+    """边流式接收边解析，每完成一行 `- xxx` 就产出一个查询"""
+    buffer = ""
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        while "\n" in buffer:
+            line, buffer = buffer.split("\n", 1)
+            if matcher := QUERY_LINE_PATTERN.match(line.rstrip("\r")):
+                yield matcher.group(1).strip()
+    if matcher := QUERY_LINE_PATTERN.match(buffer.rstrip("\r")):
+        yield matcher.group(1).strip()
+
+
+async def _think(query: str, think_model: str, decompose_prompt: dict, cache_context: Optional[str] = None) -> str:
     think_content = ""
     async for chunk in ask_llm(
             messages=decompose_prompt["query_decompose_think_prompt"].format(task=query, retrieval_str=""),
             model=think_model,
             stream=True,
             only_content=True,  # 只返回内容
+            cache_site="query_decompose_think",
+            cache_context=cache_context,
+            semantic_text=query,
     ):
         if chunk:
             think_content += chunk
-
     logger.info(f"{RequestIdCtx.request_id} query_decompose think: {think_content}")
+    return think_content
+
+
+async def query_decompose_stream(
+        query: str,
+        single_pass: bool = None,
+        searched_queries: Optional[List[str]] = None,
+        **kwargs
+) -> AsyncGenerator[str, None]:
+    """流式查询分解，每解析出一个子查询立即产出（已去重）
+
+    single_pass 为 True 时 think 与 decompose 合并为一次调用，默认取 QUERY_DECOMPOSE_SINGLE_PASS；
+    searched_queries 为之前轮次已检索的查询，计入缓存 key，后续轮次不会复用首轮的分解结果
+    """
+    if single_pass is None:
+        single_pass = os.getenv("QUERY_DECOMPOSE_SINGLE_PASS", "false") == "true"
+    model = os.getenv("QUERY_DECOMPOSE_MODEL", "gpt-4.1")
+    think_model = os.getenv("QUERY_DECOMPOSE_THINK_MODEL", "gpt-4.1")
+    current_date = time.strftime("%Y-%m-%d", time.localtime())
+    max_queries = os.getenv("QUERY_DECOMPOSE_MAX_SIZE", 5)
+    decompose_prompt = get_prompt("deepsearch")
+    cache_context = "\n".join(searched_queries) if searched_queries else None
+
+    if single_pass:
+        messages = decompose_prompt["query_decompose_single_pass_prompt"].format(
+            task=query, current_date=current_date, max_queries=max_queries)
+    else:
+        # think
+        think_content = await _think(query, think_model, decompose_prompt, cache_context)
+        # decompose
+        messages = [
+            {
+                "role": "system",
+                "content": decompose_prompt["query_decompose_prompt"].format(
+                    current_date=current_date, max_queries=max_queries)},
+            {"role": "user", "content": f"思考结果：{think_content}"},
+        ]
 
-    # decompose
-    messages = [
-        {
-            "role": "system",
-            "content": decompose_prompt["query_decompose_prompt"].format(
-                current_date=current_date, max_queries=os.getenv("QUERY_DECOMPOSE_MAX_SIZE", 5))},
-        {"role": "user", "content": f"思考结果：{think_content}"},
-    ]
     extend_queries = ""
-    async for chunk in ask_llm(
-            messages=messages,
-            model=model,
-            stream=True,
-            only_content=True,  # 只返回内容
-    ):
-        if chunk:
-            extend_queries += chunk
+
+    async def _chunks():
+        nonlocal extend_queries
+        async for chunk in ask_llm(
+                messages=messages,
+                model=model,
+                stream=True,
+                only_content=True,  # 只返回内容
+                cache_site="query_decompose",
+                cache_context=cache_context,
+                semantic_text=query,
+        ):
+            if chunk:
+                extend_queries += chunk
+                yield chunk
+
+    seen = set()
+    async for sub_query in _iter_query_lines(_chunks()):
+        if sub_query and sub_query not in seen:
+            seen.add(sub_query)
+            yield sub_query
 
     logger.info(f"{RequestIdCtx.request_id} query_decompose queries: {extend_queries}")
 
-    # 解析
-    queries = re.findall(r"^- (.+)$", extend_queries, re.MULTILINE)
-    return [match.strip() for match in queries]
+
+@timer()
+async def query_decompose(
+        query: str,
+        **kwargs
+) -> List[str]:
+    return [sub_query async for sub_query in query_decompose_stream(query=query, **kwargs)]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+from typing import Dict, List
+
+from loguru import logger
+
+from genie_tool.model.document import Doc
+
+
+def parse_engine_weights(weights: str) -> Dict[str, float]:
+    """解析引擎权重，格式: "serper:1.2,bing-search:1.0" """
+    engine_weights = {}
+    for item in (weights or "").split(","):
+        if ":" not in item:
+            continue
+        engine, weight = item.rsplit(":", 1)
+        try:
+            engine_weights[engine.strip()] = float(weight)
+        except ValueError:
+            logger.warning(f"invalid engine weight: {item}")
+    return engine_weights
+
+
+def rrf_score(doc: Doc, k: int = 60, engine_weights: Dict[str, float] = None) -> float:
+    """Reciprocal Rank Fusion: sum(weight / (k + rank))，rank 从 1 开始"""
+    engine_weights = engine_weights or {}
+    provenance = doc.data.get("engines") or [{"engine": doc.data.get("search_engine", ""), "rank": 0}]
+    return sum(engine_weights.get(p["engine"], 1.0) / (k + p["rank"] + 1) for p in provenance)
+
+
+def fuse_and_cut(docs: List[Doc], top_n: int = 0, k: int = 60, engine_weights: Dict[str, float] = None) -> List[Doc]:
+    """按 RRF 分数排序（同分保持原顺序），top_n > 0 时只保留前 top_n 个"""
+    for doc in docs:
+        doc.data["rrf_score"] = round(rrf_score(doc, k=k, engine_weights=engine_weights), 6)
+    fused = sorted(docs, key=lambda d: -d.data["rrf_score"])
+    return fused[:top_n] if top_n > 0 else fused
+
+
+if __name__ == "__main__":
+    pass
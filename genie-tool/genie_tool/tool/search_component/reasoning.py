@@ -30,12 +30,17 @@ async def search_reasoning(
         content=content,
         date=time.strftime("%Y年%m月%d日 %H时%M分%S秒", time.localtime()),
     )
+    # 语义缓存只对用户查询做相似匹配，已检索的查询和文档必须完全一致（不含时间戳）
+    cache_context = f"{history_query_list}\n{content}"
     content = ""
     async for chunk in ask_llm(
             messages=prompt_content,
             model=model,
             stream=True,
             only_content=True,  # 只返回内容
+            cache_site="search_reasoning",
+            cache_context=cache_context,
+            semantic_text=query,
     ):
         if chunk:
             content += chunk
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import List, Optional
+
+from loguru import logger
+
+from genie_tool.model.document import Doc
+from genie_tool.util.cache_util import MemoryTTLCache, SqliteTTLCache
+
+
+def normalize_query(query: str) -> str:
+    """全角转半角、小写、合并空白、去掉首尾标点"""
+    query = unicodedata.normalize("NFKC", query or "").lower()
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" \t\n?？!！.。,，;；")
+
+
+class _SearchResultCache(object):
+    """搜索结果缓存，key = engine + 归一化 query + count"""
+
+    def __init__(self):
+        self.enabled = os.getenv("SEARCH_CACHE_ENABLE", "true") == "true"
+        ttl = int(os.getenv("SEARCH_CACHE_TTL", 3600))
+        max_size = int(os.getenv("SEARCH_CACHE_MAX_SIZE", 10000))
+        if os.getenv("SEARCH_CACHE_BACKEND", "disk") == "memory":
+            self._backend = MemoryTTLCache(max_size=max_size, ttl=ttl)
+        else:
+            self._backend = SqliteTTLCache(
+                path=os.getenv("SEARCH_CACHE_PATH", ".cache/search_cache.db"),
+                table="search_result", max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def key(engine: str, query: str, count: int) -> str:
+        raw = f"{engine}\x00{normalize_query(query)}\x00{count}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, engine: str, query: str, count: int) -> Optional[List[Doc]]:
+        try:
+            value = await self._backend.aget(self.key(engine, query, count))
+        except Exception as e:
+            logger.warning(f"search cache get error: engine={engine} query={query} error={e}")
+            return None
+        if value is None:
+            return None
+        return [Doc(**dct) for dct in json.loads(value)]
+
+    async def set(self, engine: str, query: str, count: int, docs: List[Doc]):
+        value = json.dumps([doc.to_dict() for doc in docs], ensure_ascii=False)
+        try:
+            await self._backend.aset(self.key(engine, query, count), value)
+        except Exception as e:
+            logger.warning(f"search cache set error: engine={engine} query={query} error={e}")
+
+    def metrics(self) -> dict:
+        return {"enabled": self.enabled, **self._backend.metrics()}
+
+
+SearchResultCache = _SearchResultCache()
+
+
+if __name__ == "__main__":
+    pass
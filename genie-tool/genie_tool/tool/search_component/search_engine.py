@@ -8,19 +8,36 @@
 import asyncio
 import json
 import os
+import time
+from copy import deepcopy
+from dataclasses import replace
 from loguru import logger
 from abc import ABC, abstractmethod
-from typing import List
-import aiohttp
-from bs4 import BeautifulSoup
+from typing import List, Optional
 
 from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.engine_stats import EngineStats
+from genie_tool.tool.search_component.near_dedup import NearDupIndex
+from genie_tool.tool.search_component.page_fetcher import fetch_page_text
+from genie_tool.tool.search_component.rank_fusion import fuse_and_cut, parse_engine_weights
+from genie_tool.tool.search_component.search_cache import SearchResultCache, normalize_query
+from genie_tool.tool.search_component.url_canonical import merge_docs_by_url
+from genie_tool.util.http_util import HttpClientPool
 from genie_tool.util.log_util import timer
+from genie_tool.util.singleflight import SingleFlight
+
+SEARCH_SINGLEFLIGHT_ENABLE = os.getenv("SEARCH_SINGLEFLIGHT_ENABLE", "true") == "true"
+# 合并的调用共享同一份结果，跟随方拿到文档副本，避免后续处理互相影响
+SearchFlight = SingleFlight(
+    "search", copy_result=lambda docs: [replace(doc, data=deepcopy(doc.data)) for doc in docs])
 
 
 class SearchBase(ABC):
     """搜索基类"""
 
+    # 是否缓存 search 结果，聚合类引擎由子引擎各自缓存
+    _cacheable = True
+
     def __init__(self):
         self._count = int(os.getenv("SEARCH_COUNT", 10))
         self._timeout = int(os.getenv("SEARCH_TIMEOUT", 10))
@@ -31,31 +48,38 @@ class SearchBase(ABC):
         """抽象搜索方法"""
         raise NotImplementedError
 
+    async def cache_get(self, query: str, request_id: str = None) -> Optional[List[Doc]]:
+        """读取缓存的搜索结果，未命中或未开启缓存时返回 None"""
+        if not (self._cacheable and SearchResultCache.enabled):
+            return None
+        docs = await SearchResultCache.get(self._engine, query, self._count)
+        if docs is not None:
+            logger.info(f"{request_id} search cache hit: engine={self._engine} query={query}")
+        return docs
+
+    async def cache_set(self, query: str, docs: List[Doc]):
+        """缓存搜索结果，空结果不缓存"""
+        if docs and self._cacheable and SearchResultCache.enabled:
+            await SearchResultCache.set(self._engine, query, self._count, docs)
+
+    async def cached_search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
+        """带结果缓存的搜索，空结果不缓存"""
+        docs = await self.cache_get(query, request_id)
+        if docs is not None:
+            return docs
+        docs = await self.search(query=query, request_id=request_id, *args, **kwargs)
+        await self.cache_set(query, docs)
+        return docs
+
     @staticmethod
     @timer()
-    async def parser(docs: List[Doc], timeout: int=10, **kwargs) -> List[Doc]:
-        async def _parser(source_url, timeout):
-            async with aiohttp.ClientSession() as session:
-                try:
-                    async with session.get(source_url, timeout=timeout) as response:
-                        if response.content_type.lower() in [
-                                "text/html", "text/plain", "text/xml", "application/json", "application/xml", "application/octet-stream"]:
-                            return await response.text()
-                        else:
-                            # TODO 其他类型暂时不解析
-                            logger.warning(f"parser content-type[{response.content_type}] not parser: url=[{source_url}]")
-                            return ""
-                except UnicodeDecodeError as ude:
-                    return ude.args[1].decode("gb2312", errors="ignore")
-                except Exception as e:
-                    logger.warning(f"parser error: url=[{source_url}] error={e}")
-                    return ""
+    async def parser(docs: List[Doc], timeout: int=10, request_id: str = None, **kwargs) -> List[Doc]:
+        # 按搜索排名排队抓取，排名靠前的先抓
         async with asyncio.TaskGroup() as tg:
-            tasks = [tg.create_task(_parser(doc.link, timeout)) for doc in docs]
-        results = [BeautifulSoup(task.result(), "html.parser") for task in tasks]
-        results = [soup.get_text() if soup.get_text() and len(soup.get_text().strip()) > 50 else str(soup.text) for soup in results]
-        for doc, result in zip(tasks, results):
-            if result:
+            tasks = [tg.create_task(fetch_page_text(doc.link, timeout, priority=rank, request_id=request_id))
+                     for rank, doc in enumerate(docs)]
+        for doc, task in zip(docs, tasks):
+            if result := task.result():
                 doc.content = result
         return docs
 
@@ -64,18 +88,20 @@ class SearchBase(ABC):
             self, query: str, request_id: str = None, *args, **kwargs
     ) -> List[Doc]:
         """
-        搜索并去重，同时删除没有内容的文档
+        搜索并去重，同时删除没有内容的文档；相同引擎、查询和参数的并发调用合并为一次
         """
-        docs = await self.search(query=query, request_id=request_id, *args, **kwargs)
-        docs = await self.parser(docs=docs)
+        if not SEARCH_SINGLEFLIGHT_ENABLE:
+            return await self._search_and_dedup(query, request_id, *args, **kwargs)
+        key = (self._engine, normalize_query(query), self._count, args, tuple(sorted(kwargs.items())))
+        return await SearchFlight.do(key, lambda: self._search_and_dedup(query, request_id, *args, **kwargs))
 
-        seen_docs = set()
-        deduped_docs = []
-        for doc in docs:
-            if doc.content and doc.content not in seen_docs:
-                deduped_docs.append(doc)
-                seen_docs.add(doc.content)
-        return deduped_docs
+    async def _search_and_dedup(
+            self, query: str, request_id: str = None, *args, **kwargs
+    ) -> List[Doc]:
+        docs = await self.cached_search(query=query, request_id=request_id, *args, **kwargs)
+        docs = merge_docs_by_url(docs)
+        docs = await self.parser(docs=docs, request_id=request_id)
+        return NearDupIndex().dedup(docs)
 
 
 class BingSearch(SearchBase):
@@ -118,18 +144,18 @@ class BingSearch(SearchBase):
 
     async def search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
         body = self.construct_body(query, request_id)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
-                result = json.loads(await response.text())
-                return [
-                    Doc(
-                        doc_type="web_page",
-                        content=item.get("snippet", ""),
-                        title=item.get("name", ""),
-                        link=item.get("url", ""),
-                        data={"search_engine": self._engine},
-                    ) for item in result.get("webPages", {}).get("value", [])
-                ]
+        session = HttpClientPool.get_session()
+        async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
+            result = json.loads(await response.text())
+            return [
+                Doc(
+                    doc_type="web_page",
+                    content=item.get("snippet", ""),
+                    title=item.get("name", ""),
+                    link=item.get("url", ""),
+                    data={"search_engine": self._engine},
+                ) for item in result.get("webPages", {}).get("value", [])
+            ]
 
 
 class JinaSearch(BingSearch):
@@ -144,35 +170,35 @@ class JinaSearch(BingSearch):
     async def search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
         if self._use_jd_gateway:
             body = self.construct_body(query, request_id)
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
-                    result = json.loads(await response.text())
-                    return [
-                        Doc(
-                            doc_type="web_page",
-                            content=item.get("content", ""),
-                            title=item.get("title", ""),
-                            link=item.get("link", ""),
-                            data={"search_engine": self._engine},
-                        ) for item in result.get("search_result", [])
-                    ]
+            session = HttpClientPool.get_session()
+            async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
+                result = json.loads(await response.text())
+                return [
+                    Doc(
+                        doc_type="web_page",
+                        content=item.get("content", ""),
+                        title=item.get("title", ""),
+                        link=item.get("link", ""),
+                        data={"search_engine": self._engine},
+                    ) for item in result.get("search_result", [])
+                ]
         else:
             headers = {
                 "Accept": "application/json",
                 "Authorization": f"Bearer {self._api_key}"
             }
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self._url}?q={query}", headers=headers, timeout=self._timeout) as response:
-                    result = json.loads(await response.text())
-                    return [
-                        Doc(
-                            doc_type="web_page",
-                            content=item.get("content", ""),
-                            title=item.get("title", ""),
-                            link=item.get("url", ""),
-                            data={"search_engine": self._engine},
-                        ) for item in result.get("data", [])
-                    ]
+            session = HttpClientPool.get_session()
+            async with session.get(f"{self._url}?q={query}", headers=headers, timeout=self._timeout) as response:
+                result = json.loads(await response.text())
+                return [
+                    Doc(
+                        doc_type="web_page",
+                        content=item.get("content", ""),
+                        title=item.get("title", ""),
+                        link=item.get("url", ""),
+                        data={"search_engine": self._engine},
+                    ) for item in result.get("data", [])
+                ]
 
 
 class SogouSearch(JinaSearch):
@@ -204,22 +230,24 @@ class SerperSearch(JinaSearch):
     
     async def search(self, query: str, request_id: str = None, *args, **kwargs) -> List[Doc]:
         body = self.construct_body(query, request_id)
-        async with aiohttp.ClientSession() as session:
-            async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
-                result = json.loads(await response.text())
-                return [
-                    Doc(
-                        doc_type="web_page",
-                        content=item.get("snippet", ""),
-                        title=item.get("title", ""),
-                        link=item.get("link", ""),
-                        data={"search_engine": self._engine},
-                    ) for item in result.get("organic", [])
-                ]
+        session = HttpClientPool.get_session()
+        async with session.post(self._url, json=body, headers=self.headers, timeout=self._timeout) as response:
+            result = json.loads(await response.text())
+            return [
+                Doc(
+                    doc_type="web_page",
+                    content=item.get("snippet", ""),
+                    title=item.get("title", ""),
+                    link=item.get("link", ""),
+                    data={"search_engine": self._engine},
+                ) for item in result.get("organic", [])
+            ]
 
 
 class MixSearch(BingSearch):
 
+    _cacheable = False
+
     def __init__(self):
         super().__init__()
         self._engine = "mix_search"
@@ -228,6 +256,59 @@ class MixSearch(BingSearch):
         self._sogou_engine = SogouSearch()
         self._serp_engine = SerperSearch()
 
+        # 单引擎截止时间（秒），有足够样本后按观测耗时自适应收紧
+        self._engine_deadline = float(os.getenv("MIX_SEARCH_ENGINE_DEADLINE", self._timeout))
+        # 收齐 quorum 个引擎或累计 min_results 条结果即返回，0 表示等待全部引擎
+        self._quorum = int(os.getenv("MIX_SEARCH_QUORUM", 0))
+        self._min_results = int(os.getenv("MIX_SEARCH_MIN_RESULTS", 0))
+        # 引擎耗时超过其 p95 时发起一次对冲请求
+        self._hedge = os.getenv("MIX_SEARCH_HEDGE", "false") == "true"
+        # 合并后按 RRF 融合排序（关闭时保持引擎顺序），只保留前 top_n 个进入网页抓取，0 表示不截断
+        self._rank_fusion = os.getenv("MIX_SEARCH_RANK_FUSION", "true") == "true"
+        self._rrf_k = int(os.getenv("MIX_SEARCH_RRF_K", 60))
+        self._top_n = int(os.getenv("MIX_SEARCH_TOP_N", 0))
+        self._engine_weights = parse_engine_weights(os.getenv("MIX_SEARCH_ENGINE_WEIGHTS", ""))
+
+    async def _search_engine(self, engine: SearchBase, query: str, request_id: str = None) -> List[Doc]:
+        """单引擎搜索（不抓取网页），带截止时间和可选的对冲请求，先返回的结果生效
+
+        缓存命中直接返回，只有真实的引擎调用计入耗时和熔断统计。
+        """
+        docs = await engine.cache_get(query, request_id)
+        if docs is not None:
+            return docs
+        start_time = time.time()
+        tasks = {asyncio.create_task(engine.search(query=query, request_id=request_id))}
+        error = None
+        try:
+            async with asyncio.timeout(EngineStats.timeout(engine._engine, self._engine_deadline)):
+                hedge_after = EngineStats.percentile(engine._engine, 0.95) if self._hedge else None
+                if hedge_after is not None:
+                    done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                    if not done:
+                        logger.info(f"{request_id} hedge search: engine={engine._engine} after={hedge_after:.3f}s")
+                        tasks.add(asyncio.create_task(engine.search(query=query, request_id=request_id)))
+                while tasks:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            EngineStats.record_success(engine._engine, time.time() - start_time)
+                            docs = task.result()
+                            break
+                        error = task.exception()
+                    if docs is not None:
+                        break
+                else:
+                    raise error
+        except Exception as e:
+            EngineStats.record_failure(engine._engine, e)
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+        await engine.cache_set(query, docs)
+        return docs
+
     async def search(
             self, query: str, request_id: str = None,
             use_bing: bool = True, use_jina: bool = True, use_sogou: bool = True,
@@ -242,8 +323,42 @@ class MixSearch(BingSearch):
             engines.append(self._sogou_engine)
         if use_serp:
             engines.append(self._serp_engine)
-        async with asyncio.TaskGroup() as tg:
-            tasks = [tg.create_task(engine.search_and_dedup(query=query, request_id=request_id)) for engine in engines]
-        results = [task.result() for task in tasks]
-        return [doc for docs in results for doc in docs]
-
+        # 跳过熔断中的引擎，全部熔断时仍然全部尝试
+        healthy_engines = [engine for engine in engines if EngineStats.allow(engine._engine)]
+        if len(healthy_engines) < len(engines):
+            logger.warning(f"{request_id} skip unhealthy engines: "
+                           f"{[e._engine for e in engines if e not in healthy_engines]}")
+        engines = healthy_engines or engines
+
+        quorum = min(self._quorum or len(engines), len(engines))
+        tasks = {asyncio.create_task(self._search_engine(engine, query, request_id)): engine for engine in engines}
+        results = {}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    engine = tasks[task]
+                    if task.exception() is not None:
+                        # 单个引擎失败不影响其他引擎
+                        logger.warning(f"{request_id} search error: engine={engine._engine} error={task.exception()!r}")
+                    else:
+                        results[engine] = task.result()
+                if len(results) >= quorum or (
+                        self._min_results and sum(len(docs) for docs in results.values()) >= self._min_results):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.info(f"{request_id} cancel straggler engines: {[tasks[t]._engine for t in pending]}")
+        # 跨引擎按规范化 URL 合并，后续 parser 每个 URL 只抓取一次
+        docs = [doc for engine in engines for doc in results.get(engine, [])]
+        merged_docs = merge_docs_by_url(docs)
+        logger.info(f"{request_id} mix search merge by url: {len(docs)} -> {len(merged_docs)}")
+        if not self._rank_fusion:
+            # 不融合排序时按引擎顺序截断
+            return merged_docs[:self._top_n] if self._top_n > 0 else merged_docs
+        fused_docs = fuse_and_cut(merged_docs, top_n=self._top_n, k=self._rrf_k, engine_weights=self._engine_weights)
+        logger.info(f"{request_id} mix search rank fusion: {len(merged_docs)} -> {len(fused_docs)}")
+        return fused_docs
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import re
+from collections import defaultdict
+from typing import Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from genie_tool.model.document import Doc
+
+# 广告/统计类跟踪参数，不影响页面内容；from、ref、fr、amp 等通用参数名在不少站点决定页面内容，不在此列
+TRACKING_PARAMS = {
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_hsenc", "_hsmi",
+    "spm", "scm", "ref_src", "share_source", "share_medium", "sharesource", "tt_from", "wfr", "vd_source",
+}
+TRACKING_PREFIXES = ("utm_", "wt.", "hmsr", "hmpl", "hmcu", "hmkw", "hmci")
+# 移动版/AMP 子域名
+MOBILE_HOST_PREFIXES = ("www.", "m.", "mobile.", "wap.", "amp.")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+AMP_PATH_PATTERN = re.compile(r"(/amp)+/?$|\.amp(?=\.html?$)", re.IGNORECASE)
+
+
+def _clean_query(query: str) -> str:
+    params = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True)
+              if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)]
+    return urlencode(sorted(params))
+
+
+def canonicalize_url(url: str) -> str:
+    """规范化 URL：小写 scheme/host、去默认端口、去跟踪参数和 fragment、参数排序"""
+    if not url:
+        return url
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return url
+    if not scheme or not host:
+        return url
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", _clean_query(parts.query), ""))
+
+
+def url_key(url: str) -> str:
+    """去重用的 key：在 canonicalize_url 基础上忽略 scheme、www/移动版子域名、AMP 路径和末尾斜杠"""
+    url = canonicalize_url(url)
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+    host = parts.netloc
+    for prefix in MOBILE_HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+            break
+    path = AMP_PATH_PATTERN.sub("", parts.path).rstrip("/") or "/"
+    return f"{host}{path}" + (f"?{parts.query}" if parts.query else "")
+
+
+def merge_docs_by_url(docs: List[Doc]) -> List[Doc]:
+    """按规范化 URL 合并多引擎结果，保留首次出现的文档，并在 data["engines"] 记录各引擎来源和排名
+
+    规范化只用于去重 key，doc.link 保持搜索引擎返回的原始链接，抓取时使用原始链接。
+    """
+    merged: Dict[str, Doc] = {}
+    no_link = []
+    ranks = defaultdict(int)
+    for doc in docs:
+        engine = doc.data.get("search_engine", "")
+        rank = ranks[engine]
+        ranks[engine] += 1
+        if not doc.link:
+            no_link.append(doc)
+            continue
+        # 已合并过的文档沿用原来源记录
+        provenance = doc.data.get("engines") or [{"engine": engine, "rank": rank, "link": doc.link}]
+        key = url_key(doc.link)
+        if key in merged:
+            merged[key].data["engines"].extend(provenance)
+            continue
+        doc.data = {**doc.data, "engines": list(provenance)}
+        merged[key] = doc
+    return list(merged.values()) + no_link
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class MemoryTTLCache(object):
+    """进程内 TTL + LRU 缓存"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None or item[0] < time.time():
+            if item is not None:
+                self._data.pop(key, None)
+            self.stats["misses"] += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return item[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.time() + (ttl or self._ttl), value)
+        self._data.move_to_end(key)
+        self.stats["sets"] += 1
+        while len(self._data) > self._max_size:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set(key, value, ttl=ttl)
+
+    def __len__(self):
+        return len(self._data)
+
+    def metrics(self) -> dict:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._data),
+            "hit_ratio": round(self.stats["hits"] / total, 4) if total else 0.0,
+        }
+
+
+class SqliteTTLCache(object):
+    """基于 sqlite(WAL) 的磁盘 TTL + LRU 缓存，重启不丢失，同机多个 worker 进程共享
+
+    value 为字符串，序列化由调用方负责；max_bytes > 0 时额外按 value 总长度淘汰
+    """
+
+    _EVICT_INTERVAL = 64
+
+    def __init__(self, path: str, table: str = "cache", max_size: int = 10000, ttl: float = 3600, max_bytes: int = 0):
+        self._path = path
+        self._table = table
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._set_count = 0
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self._path):
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                f"key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                f"expire_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self._table}_accessed ON {self._table} (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                f"SELECT value FROM {self._table} WHERE key = ? AND expire_at > ?", (key, now)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            conn.execute(f"UPDATE {self._table} SET accessed_at = ? WHERE key = ?", (now, key))
+        self.stats["hits"] += 1
+        return row[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self._table} (key, value, size, expire_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + (ttl or self._ttl), now))
+            self.stats["sets"] += 1
+            self._set_count += 1
+            if self._set_count % self._EVICT_INTERVAL == 0:
+                self._evict(conn, now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {self._table} WHERE key = ?", (key,))
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """先删过期，再按最近访问时间淘汰超出条数/字节上限的部分"""
+        evicted = conn.execute(f"DELETE FROM {self._table} WHERE expire_at <= ?", (now,)).rowcount
+        count, total_bytes = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self._table}").fetchone()
+        if count > self._max_size:
+            evicted += conn.execute(
+                f"DELETE FROM {self._table} WHERE key IN "
+                f"(SELECT key FROM {self._table} ORDER BY accessed_at ASC LIMIT ?)", (count - self._max_size,)).rowcount
+        if self._max_bytes > 0 and total_bytes > self._max_bytes:
+            overflow = total_bytes - self._max_bytes
+            rows = conn.execute(f"SELECT key, size FROM {self._table} ORDER BY accessed_at ASC").fetchall()
+            keys = []
+            for key, size in rows:
+                if overflow <= 0:
+                    break
+                keys.append(key)
+                overflow -= size
+            conn.executemany(f"DELETE FROM {self._table} WHERE key = ?", [(k,) for k in keys])
+            evicted += len(keys)
+        self.stats["evictions"] += evicted
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def metrics(self) -> dict:
+        total = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "path": self._path,
+            "hit_ratio": round(self.stats["hits"] / total, 4) if total else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import os
+from types import SimpleNamespace
+from typing import Dict
+
+import aiohttp
+from loguru import logger
+
+
+class _HttpClientPool(object):
+    """进程级共享的 HTTP 连接池，搜索引擎和网页抓取共用，复用 TCP/TLS 连接和 DNS 缓存"""
+
+    def __init__(self):
+        # aiohttp.ClientSession 绑定事件循环，按 loop 维护
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._stats = {
+            "requests": 0,
+            "connection_create": 0,
+            "connection_reuse": 0,
+            "dns_cache_hit": 0,
+            "dns_cache_miss": 0,
+            "request_exception": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        def _counter(key: str):
+            async def _on_event(session: aiohttp.ClientSession, ctx: SimpleNamespace, params):
+                self._stats[key] += 1
+            return _on_event
+
+        trace_config.on_request_start.append(_counter("requests"))
+        trace_config.on_connection_create_end.append(_counter("connection_create"))
+        trace_config.on_connection_reuseconn.append(_counter("connection_reuse"))
+        trace_config.on_dns_cache_hit.append(_counter("dns_cache_hit"))
+        trace_config.on_dns_cache_miss.append(_counter("dns_cache_miss"))
+        trace_config.on_request_exception.append(_counter("request_exception"))
+        return trace_config
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=int(os.getenv("HTTP_POOL_LIMIT", 200)),
+            limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", 10)),
+            ttl_dns_cache=int(os.getenv("HTTP_POOL_DNS_CACHE_TTL", 300)),
+            keepalive_timeout=int(os.getenv("HTTP_POOL_KEEPALIVE_TIMEOUT", 30)),
+            enable_cleanup_closed=True,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[self._trace_config()],
+        )
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """获取当前事件循环下的共享 session，不要在调用方 close"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = self._create_session()
+            self._sessions[loop] = session
+        # 清理已关闭事件循环遗留的 session
+        for stale_loop in [l for l in self._sessions if l is not loop and l.is_closed()]:
+            self._sessions.pop(stale_loop, None)
+        return session
+
+    async def close(self):
+        """关闭当前事件循环下的 session，在应用 shutdown 时调用"""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.pop(loop, None)
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info(f"http client pool closed. stats={self.metrics()}")
+
+    def metrics(self) -> dict:
+        created = self._stats["connection_create"]
+        reused = self._stats["connection_reuse"]
+        connections = {"acquired": 0, "idle": 0}
+        for session in self._sessions.values():
+            connector = session.connector
+            if session.closed or connector is None:
+                continue
+            connections["acquired"] += len(getattr(connector, "_acquired", ()))
+            connections["idle"] += sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        return {
+            **self._stats,
+            **connections,
+            "sessions": len(self._sessions),
+            "reuse_ratio": round(reused / (created + reused), 4) if created + reused else 0.0,
+        }
+
+
+HttpClientPool = _HttpClientPool()
+
+
+if __name__ == "__main__":
+    pass
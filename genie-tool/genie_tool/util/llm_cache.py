@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import hashlib
+import json
+import os
+from collections import defaultdict
+from typing import Any, List, Optional
+
+from loguru import logger
+
+from genie_tool.util.cache_util import MemoryTTLCache, SqliteTTLCache
+
+
+def _normalize_messages(messages: List[Any]) -> List[Any]:
+    """去掉文本内容首尾空白，其余字段原样参与 key"""
+    normalized = []
+    for message in messages:
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            message = {**message, "content": message["content"].strip()}
+        normalized.append(message)
+    return normalized
+
+
+class _LLMResponseCache(object):
+    """LLM 响应缓存（按调用点开启）：内存 + sqlite 两级，TTL + LRU
+
+    只缓存 only_content 的完整输出，按原始分块保存，命中时按相同分块回放，流式调用方无感知。
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_CACHE_ENABLE", "false") == "true"
+        # 开启缓存的调用点，* 表示全部
+        self.sites = {s.strip() for s in os.getenv(
+            "LLM_CACHE_SITES", "query_decompose_think,query_decompose,search_reasoning").split(",") if s.strip()}
+        ttl = int(os.getenv("LLM_CACHE_TTL", 86400))
+        self._memory = MemoryTTLCache(max_size=int(os.getenv("LLM_CACHE_MEMORY_SIZE", 1000)), ttl=ttl)
+        self._disk = SqliteTTLCache(
+            path=os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.db"), table="llm_response",
+            max_size=int(os.getenv("LLM_CACHE_MAX_SIZE", 20000)), ttl=ttl,
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+        ) if os.getenv("LLM_CACHE_BACKEND", "disk") == "disk" else None
+        self.stats = defaultdict(lambda: {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0})
+
+    def enabled_for(self, site: Optional[str]) -> bool:
+        return self.enabled and bool(site) and ("*" in self.sites or site in self.sites)
+
+    @staticmethod
+    def key(model: str, messages: List[Any], stream: bool, **params) -> str:
+        raw = json.dumps({
+            "model": model,
+            "messages": _normalize_messages(messages),
+            "stream": stream,
+            "params": {k: v for k, v in params.items() if v is not None},
+        }, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, site: str, key: str) -> Optional[List[str]]:
+        stats = self.stats[site]
+        chunks = self._memory.get(key)
+        if chunks is not None:
+            stats["hits"] += 1
+            stats["memory_hits"] += 1
+            return chunks
+        if self._disk is not None:
+            try:
+                value = await self._disk.aget(key)
+            except Exception as e:
+                logger.warning(f"llm cache get error: site={site} error={e}")
+                value = None
+            if value is not None:
+                chunks = json.loads(value)
+                self._memory.set(key, chunks)
+                stats["hits"] += 1
+                stats["disk_hits"] += 1
+                return chunks
+        stats["misses"] += 1
+        return None
+
+    async def set(self, site: str, key: str, chunks: List[str]):
+        self._memory.set(key, chunks)
+        self.stats[site]["sets"] += 1
+        if self._disk is not None:
+            try:
+                await self._disk.aset(key, json.dumps(chunks, ensure_ascii=False))
+            except Exception as e:
+                logger.warning(f"llm cache set error: site={site} error={e}")
+
+    def metrics(self) -> dict:
+        sites = {}
+        for site, stats in self.stats.items():
+            total = stats["hits"] + stats["misses"]
+            sites[site] = {**stats, "hit_ratio": round(stats["hits"] / total, 4) if total else 0.0}
+        return {
+            "enabled": self.enabled,
+            "sites": sites,
+            "memory": self._memory.metrics(),
+            "disk": self._disk.metrics() if self._disk is not None else None,
+        }
+
+
+LLMResponseCache = _LLMResponseCache()
+
+
+if __name__ == "__main__":
+    pass
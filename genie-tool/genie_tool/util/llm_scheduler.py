@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from genie_tool.model.context import RequestIdCtx
+from genie_tool.util.token_util import estimate_tokens
+
+# 优先级：数值越小越先调度
+PRIORITIES = {"interactive": 0, "default": 1, "batch": 2}
+PRIORITY_NAMES = {v: k for k, v in PRIORITIES.items()}
+
+
+class LLMOverloadedError(Exception):
+    """LLM 排队已满或排队超时"""
+
+
+def _parse_map(value: str, cast=int) -> Dict[str, Any]:
+    """解析 name:value,name:value 格式的配置"""
+    result = {}
+    for item in value.split(","):
+        name, _, v = item.rpartition(":")
+        if name.strip() and v.strip():
+            result[name.strip()] = cast(v.strip())
+    return result
+
+
+def estimate_message_tokens(messages: Any, counter: Callable[[str], int] = estimate_tokens) -> int:
+    """估算消息 token 数，兼容 dict 消息、smolagents ChatMessage 及多模态 content 列表"""
+    if isinstance(messages, str):
+        return counter(messages)
+    total = 0
+    for message in messages or []:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+        if isinstance(content, list):
+            content = " ".join(item.get("text", "") for item in content if isinstance(item, dict))
+        total += counter(content or "") + 4
+    return total
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+def is_model_unavailable(error: BaseException) -> bool:
+    """超时、连接错误、5xx 和 429 说明模型服务不可用；参数错误、超出上下文等请求本身的问题不算"""
+    if isinstance(error, (TimeoutError, ConnectionError)) or is_rate_limited(error):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code >= 500 or status_code == 408
+    return any(name in type(error).__name__ for name in ("Timeout", "Connection", "ServiceUnavailable"))
+
+
+class _Waiter(object):
+    def __init__(self, priority: int, tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.priority = priority
+        self.tokens = tokens
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.enqueued_at = time.time()
+        self.granted = False
+        self.abandoned = False
+
+
+class Lease(object):
+    """已获得的调用额度，settle 用实际 token 数修正预留额度"""
+
+    def __init__(self, limiter: Optional["_ModelLimiter"] = None, tokens: int = 0):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.actual_tokens: Optional[int] = None
+
+    def settle(self, actual_tokens: int):
+        self.actual_tokens = actual_tokens
+
+    def release(self):
+        if self.limiter is not None:
+            self.limiter.release(self.tokens, self.actual_tokens)
+            self.limiter = None
+
+
+class _ModelLimiter(object):
+    """单个模型：并发上限 + 每分钟 token 令牌桶，按优先级顺序放行（线程安全）"""
+
+    def __init__(self, model: str, concurrency: int, tpm: int, queue_limits: Dict[str, int], cooldown: float):
+        self.model = model
+        self.concurrency = concurrency
+        self.tpm = tpm
+        self.queue_limits = queue_limits
+        self.cooldown = cooldown
+        self.tokens = float(tpm)
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0
+        self.running = 0
+        self._lock = threading.Lock()
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._timer: Optional[threading.Timer] = None
+        self._timer_at = 0.0
+        self.stats = {"admitted": 0, "rejected": 0, "timeouts": 0, "rate_limited": 0}
+        self.queue_stats = defaultdict(lambda: {"admitted": 0, "queued_ms": 0.0, "max_queued_ms": 0.0})
+
+    def _waiting(self) -> Dict[str, int]:
+        counts = {name: 0 for name in PRIORITIES}
+        for _, _, waiter in self._heap:
+            if not waiter.abandoned:
+                counts[PRIORITY_NAMES[waiter.priority]] += 1
+        return counts
+
+    def _overloaded(self, priority: str) -> bool:
+        limit = self.queue_limits.get(priority, 0)
+        return limit > 0 and sum(self._waiting().values()) >= limit
+
+    def overloaded(self, priority: str) -> bool:
+        with self._lock:
+            return self._overloaded(priority)
+
+    def submit(self, waiter: _Waiter, priority: str):
+        with self._lock:
+            if self._overloaded(priority):
+                self.stats["rejected"] += 1
+                raise LLMOverloadedError(f"llm queue is full: model={self.model} priority={priority}")
+            heapq.heappush(self._heap, (waiter.priority, next(self._seq), waiter))
+            self._dispatch()
+
+    def abandon(self, waiter: _Waiter, timed_out: bool = False) -> bool:
+        """放弃等待，返回是否已经被放行（已放行的需要调用方释放）"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.abandoned = True
+            if timed_out:
+                self.stats["timeouts"] += 1
+            self._dispatch()
+            return False
+
+    def release(self, reserved: int, actual: Optional[int]):
+        with self._lock:
+            self.running -= 1
+            if self.tpm and actual is not None:
+                self.tokens = min(self.tpm, self.tokens + reserved - actual)
+            self._dispatch()
+
+    def rate_limited(self, retry_after: Optional[float]) -> float:
+        delay = retry_after if retry_after and retry_after > 0 else self.cooldown
+        with self._lock:
+            self.stats["rate_limited"] += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+        return delay
+
+    def _refill(self, now: float):
+        if self.tpm:
+            self.tokens = min(self.tpm, self.tokens + (now - self.refilled_at) * self.tpm / 60)
+        self.refilled_at = now
+
+    def _dispatch(self):
+        now = time.monotonic()
+        self._refill(now)
+        wait = 0.0
+        while self._heap and self.running < self.concurrency:
+            _, _, waiter = self._heap[0]
+            if waiter.abandoned:
+                heapq.heappop(self._heap)
+                continue
+            if now < self.paused_until:
+                wait = self.paused_until - now
+                break
+            # 严格按优先级：队首额度不足时不让后面的小请求插队，避免大请求饿死
+            cost = min(waiter.tokens, self.tpm) if self.tpm else 0
+            if cost > self.tokens:
+                wait = (cost - self.tokens) * 60 / self.tpm
+                break
+            heapq.heappop(self._heap)
+            self.tokens -= cost
+            self.running += 1
+            self._grant(waiter)
+        if wait <= 0:
+            return
+        # 后到的高优先级请求需要的等待更短时，提前定时器
+        deadline = now + wait
+        if self._timer is not None and deadline >= self._timer_at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        timer = threading.Timer(wait, self._on_timer)
+        timer.args = (timer,)
+        timer.daemon = True
+        self._timer, self._timer_at = timer, deadline
+        timer.start()
+
+    def _on_timer(self, timer: threading.Timer):
+        with self._lock:
+            # 已被替换的定时器不再清理当前定时器
+            if self._timer is timer:
+                self._timer = None
+            self._dispatch()
+
+    def _grant(self, waiter: _Waiter):
+        waiter.granted = True
+        queued_ms = (time.time() - waiter.enqueued_at) * 1000
+        name = PRIORITY_NAMES[waiter.priority]
+        self.stats["admitted"] += 1
+        self.queue_stats[name]["admitted"] += 1
+        self.queue_stats[name]["queued_ms"] += queued_ms
+        self.queue_stats[name]["max_queued_ms"] = max(self.queue_stats[name]["max_queued_ms"], queued_ms)
+        if waiter.future is not None:
+            waiter.loop.call_soon_threadsafe(self._resolve, waiter)
+        else:
+            waiter.event.set()
+
+    def _resolve(self, waiter: _Waiter):
+        if not waiter.future.done():
+            waiter.future.set_result(None)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "concurrency": self.concurrency,
+                "tpm": self.tpm,
+                "running": self.running,
+                "waiting": self._waiting(),
+                "available_tokens": int(self.tokens) if self.tpm else None,
+                "paused_ms": max(0, int((self.paused_until - time.monotonic()) * 1000)),
+                **self.stats,
+                "queues": {
+                    name: {
+                        "admitted": stats["admitted"],
+                        "avg_queued_ms": round(stats["queued_ms"] / stats["admitted"], 2) if stats["admitted"] else 0.0,
+                        "max_queued_ms": round(stats["max_queued_ms"], 2),
+                    }
+                    for name, stats in self.queue_stats.items()
+                },
+            }
+
+
+class _LLMScheduler(object):
+    """LLM 调用统一调度：按模型限制并发和每分钟 token，优先级 interactive > default > batch，
+    排队满或超时抛 LLMOverloadedError，收到 429 后暂停该模型放行
+
+    ask_llm（协程）和 smolagents 模型（工作线程同步调用）共用同一份额度。
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_SCHEDULER_ENABLE", "true") == "true"
+        self.default_concurrency = int(os.getenv("LLM_DEFAULT_CONCURRENCY", 32))
+        self.default_tpm = int(os.getenv("LLM_DEFAULT_TPM", 0))
+        self.model_concurrency = _parse_map(os.getenv("LLM_MODEL_CONCURRENCY", ""))
+        self.model_tpm = _parse_map(os.getenv("LLM_MODEL_TPM", ""))
+        self.queue_limits = _parse_map(os.getenv("LLM_QUEUE_LIMITS", "interactive:200,default:100,batch:20"))
+        self.queue_timeout = float(os.getenv("LLM_QUEUE_TIMEOUT", 120))
+        self.output_tokens = int(os.getenv("LLM_SCHEDULER_OUTPUT_TOKENS", 1000))
+        self.cooldown = float(os.getenv("LLM_RATE_LIMIT_COOLDOWN", 5))
+        self.retries = int(os.getenv("LLM_RATE_LIMIT_RETRIES", 2))
+        self._limiters: Dict[str, _ModelLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, model: str) -> _ModelLimiter:
+        with self._lock:
+            if model not in self._limiters:
+                self._limiters[model] = _ModelLimiter(
+                    model,
+                    concurrency=self.model_concurrency.get(model, self.default_concurrency),
+                    tpm=self.model_tpm.get(model, self.default_tpm),
+                    queue_limits=self.queue_limits,
+                    cooldown=self.cooldown,
+                )
+            return self._limiters[model]
+
+    def reserve_tokens(self, prompt_tokens: int, max_tokens: Optional[int] = None) -> int:
+        """预留 token = 输入估算 + 输出预估（不超过 max_tokens），完成后用 Lease.settle 按实际修正"""
+        return prompt_tokens + (min(max_tokens, self.output_tokens) if max_tokens else self.output_tokens)
+
+    def overloaded(self, model: str, priority: str = "default") -> bool:
+        return self.enabled and self._limiter(model).overloaded(priority)
+
+    @asynccontextmanager
+    async def slot(self, model: str, tokens: int, priority: str = "default"):
+        if not self.enabled:
+            yield Lease()
+            return
+        limiter = self._limiter(model)
+        waiter = _Waiter(PRIORITIES.get(priority, PRIORITIES["default"]), tokens, asyncio.get_running_loop())
+        limiter.submit(waiter, priority)
+        try:
+            async with asyncio.timeout(self.queue_timeout or None):
+                await waiter.future
+        except TimeoutError as e:
+            # 超时的同时已被放行则继续使用
+            if not limiter.abandon(waiter, timed_out=True):
+                raise LLMOverloadedError(f"llm queue timeout: model={model} priority={priority}") from e
+        except asyncio.CancelledError:
+            if limiter.abandon(waiter):
+                limiter.release(tokens, 0)
+            raise
+        lease = Lease(limiter, tokens)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    @contextmanager
+    def sync_slot(self, model: str, tokens: int, priority: str = "default"):
+        """同步调用方使用，只能在工作线程中调用，不能阻塞事件循环线程"""
+        if not self.enabled:
+            yield Lease()
+            return
+        limiter = self._limiter(model)
+        waiter = _Waiter(PRIORITIES.get(priority, PRIORITIES["default"]), tokens)
+        limiter.submit(waiter, priority)
+        if not waiter.event.wait(self.queue_timeout or None) and not limiter.abandon(waiter, timed_out=True):
+            raise LLMOverloadedError(f"llm queue timeout: model={model} priority={priority}")
+        lease = Lease(limiter, tokens)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def rate_limited(self, model: str, error: BaseException) -> float:
+        """记录 429，暂停该模型放行，返回建议等待秒数"""
+        retry_after = None
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after", 0))
+        except (TypeError, ValueError):
+            pass
+        delay = self._limiter(model).rate_limited(retry_after) if self.enabled else self.cooldown
+        logger.warning(f"{RequestIdCtx.request_id} llm rate limited: model={model} pause={delay}s error={error!r}")
+        return delay
+
+    def metrics(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queue_limits": self.queue_limits,
+            "queue_timeout": self.queue_timeout,
+            "models": {model: limiter.metrics() for model, limiter in list(self._limiters.items())},
+        }
+
+
+LLMScheduler = _LLMScheduler()
+
+
+if __name__ == "__main__":
+    pass
@@ -5,13 +5,25 @@
 # Author: liumin.423
 # Date:   2025/7/8
 # =====================
+import asyncio
+import inspect
 import json
 import os
-from typing import List, Any, Optional
+import time
+from functools import lru_cache
+from typing import List, Any, Optional, Tuple
 
-from litellm import acompletion
+from litellm import acompletion, get_supported_openai_params
+from loguru import logger
 
+from genie_tool.model.context import LLMModelInfoFactory, LLMPriorityCtx, RequestIdCtx
+from genie_tool.util.llm_cache import LLMResponseCache
+from genie_tool.util.llm_scheduler import (
+    LLMScheduler, estimate_message_tokens, is_model_unavailable, is_rate_limited)
 from genie_tool.util.log_util import timer, AsyncTimer
+from genie_tool.util.semantic_cache import SemanticCache
+from genie_tool.util.token_usage import TokenUsageRecorder, usage_tokens
+from genie_tool.util.token_util import count_tokens, estimate_tokens
 from genie_tool.util.sensitive_detection import SensitiveWordsReplace
 
 
@@ -25,6 +37,9 @@ async def ask_llm(
 
         # 自定义字段
         only_content: bool = False,     # 只返回内容
+        cache_site: Optional[str] = None,   # 调用点名称，LLM_CACHE_SITES 中开启时走响应缓存
+        cache_context: Optional[str] = None,    # 消息之外影响输出的上下文（如已检索的查询），参与缓存 key，语义缓存要求精确一致
+        semantic_text: Optional[str] = None,    # 语义缓存文本（如用户查询），SEMANTIC_CACHE_SITES 中开启时按相似度复用
 
         extra_headers: Optional[dict] = None,
         **kwargs,
@@ -39,6 +54,148 @@ async def ask_llm(
                 message["content"] = json.loads(
                     SensitiveWordsReplace.replace(json.dumps(message["content"], ensure_ascii=False)))
     
+    cache_key, semantic_key, cached = None, None, None
+    if only_content and LLMResponseCache.enabled_for(cache_site):
+        cache_key = LLMResponseCache.key(
+            model, messages, stream, temperature=temperature, top_p=top_p, cache_context=cache_context, **kwargs)
+        cached = await LLMResponseCache.get(cache_site, cache_key)
+    if cached is None and only_content and semantic_text and SemanticCache.enabled_for(cache_site):
+        semantic_key = (cache_site, SemanticCache.namespace(
+            cache_site, model, stream, context=cache_context, temperature=temperature, top_p=top_p, **kwargs),
+                        semantic_text)
+        cached = SemanticCache.get(*semantic_key)
+    if cached is not None:
+        logger.info(f"{RequestIdCtx.request_id} llm cache hit: site={cache_site} "
+                    f"semantic={semantic_key is not None} chunks={len(cached)}")
+        if stream:
+            for chunk in cached:
+                yield chunk
+        else:
+            yield "".join(cached)
+        return
+
+    prompt_tokens = estimate_message_tokens(messages)
+    output_tokens = LLMScheduler.reserve_tokens(0, kwargs.get("max_tokens"))
+    candidates = LLMModelInfoFactory.route(model, prompt_tokens + output_tokens, output_tokens)
+    if candidates != [model]:
+        logger.info(f"{RequestIdCtx.request_id} llm route: requested={model} candidates={candidates} "
+                    f"need_tokens={prompt_tokens + output_tokens}")
+    # 已输出给调用方的内容（only_content 时为文本分块）
+    chunks = []
+    for index, candidate in enumerate(candidates):
+        has_fallback = index < len(candidates) - 1
+        attempt_messages = messages
+        if chunks:
+            # 流式中途回退：带上已输出内容，让备选模型续写
+            attempt_messages = messages + [
+                {"role": "assistant", "content": "".join(chunks)},
+                {"role": "user", "content": LLMModelInfoFactory.continue_prompt},
+            ]
+        completion_kwargs = _completion_kwargs(
+            attempt_messages, candidate, stream, temperature, top_p, extra_headers, **kwargs)
+        if stream and only_content and "stream_options" not in kwargs and _supports_stream_usage(candidate):
+            # 流式最后一个 chunk 返回 usage
+            completion_kwargs["stream_options"] = {"include_usage": True}
+        start_time, first_token_time, output, emitted = time.time(), None, [], 0
+        response, usage = None, None
+        try:
+            async with LLMScheduler.slot(
+                    candidate, LLMScheduler.reserve_tokens(prompt_tokens, kwargs.get("max_tokens")),
+                    priority=LLMPriorityCtx.priority) as lease:
+                async with AsyncTimer(key=f"exec ask_llm"):
+                    # 有备选模型时才限制首 token / 输出停顿时间，最后一个候选不设超时
+                    async with asyncio.timeout(LLMModelInfoFactory.ttft_timeout if has_fallback else None):
+                        response = await _acompletion(candidate, completion_kwargs, retry=not has_fallback)
+                    if stream:
+                        finished = False
+                        iterator = response.__aiter__()
+                        try:
+                            while True:
+                                if not has_fallback:
+                                    timeout = None
+                                elif first_token_time is None:
+                                    timeout = max(0.0, LLMModelInfoFactory.ttft_timeout - (time.time() - start_time))
+                                else:
+                                    timeout = LLMModelInfoFactory.stall_timeout or None
+                                try:
+                                    async with asyncio.timeout(timeout):
+                                        chunk = await anext(iterator)
+                                except StopAsyncIteration:
+                                    break
+                                if getattr(chunk, "usage", None):
+                                    usage = chunk.usage
+                                content = chunk.choices[0].delta.content if chunk.choices and chunk.choices[0] \
+                                    and chunk.choices[0].delta else None
+                                if content:
+                                    first_token_time = first_token_time or time.time()
+                                    output.append(content)
+                                if only_content:
+                                    if content:
+                                        chunks.append(content)
+                                        emitted += 1
+                                        yield content
+                                else:
+                                    emitted += 1
+                                    yield chunk
+                            finished = True
+                        finally:
+                            if not finished:
+                                # 被取消、超时或调用方提前关闭时关闭底层流，释放连接、停止生成
+                                await _close_stream(response)
+                    else:
+                        first_token_time = time.time()
+                        usage = getattr(response, "usage", None)
+                        content = response.choices[0].message.content
+                        output.append(content or "")
+                        if only_content and content:
+                            chunks.append(content)
+                    output_text = "".join(output)
+                    lease.settle(sum(_attempt_usage(attempt_messages, output_text, usage)[:2]))
+        except Exception as e:
+            timed_out = isinstance(e, TimeoutError)
+            # 只有模型服务不可用才计入健康度，本地排队已满、请求参数错误等不算
+            if is_model_unavailable(e):
+                LLMModelInfoFactory.record_failure(candidate, timeout=timed_out)
+            midstream = emitted > 0
+            if not has_fallback or (midstream and not (
+                    stream and only_content and LLMModelInfoFactory.midstream_fallback)):
+                raise
+            logger.warning(f"{RequestIdCtx.request_id} llm fallback: model={candidate} -> {candidates[index + 1]} "
+                           f"timeout={timed_out} midstream={midstream} error={e!r}")
+            continue
+        finally:
+            # 拿到响应即计入使用量，包括中途失败、被取消或调用方提前关闭的流
+            if response is not None:
+                prompt_used, completion_used, estimated = _attempt_usage(attempt_messages, "".join(output), usage)
+                TokenUsageRecorder.record(candidate, prompt_used, completion_used, estimated, site=cache_site)
+
+        end_time = time.time()
+        LLMModelInfoFactory.record_success(
+            candidate,
+            ttft=first_token_time - start_time if first_token_time else None,
+            output_tokens=estimate_tokens(output_text),
+            duration=end_time - first_token_time if first_token_time else 0.0,
+        )
+        if candidate != model:
+            logger.info(f"{RequestIdCtx.request_id} llm routed: requested={model} used={candidate} "
+                        f"cost={int((end_time - start_time) * 1000)}ms")
+        # 只缓存完整生成的结果，被取消或中断的不写入
+        if chunks:
+            await _store_cache(cache_site, cache_key, semantic_key, chunks)
+        if not stream:
+            yield content if only_content else response
+        return
+
+
+def _completion_kwargs(
+        messages: List[Any],
+        model: str,
+        stream: bool,
+        temperature: float = None,
+        top_p: float = None,
+        extra_headers: Optional[dict] = None,
+        **kwargs,
+) -> dict:
     # 设置LiteLLM调用参数
     completion_kwargs = {
         "messages": messages,
@@ -64,18 +221,61 @@ async def ask_llm(
             completion_kwargs["api_key"] = api_key
         if base_url:
             completion_kwargs["base_url"] = base_url
-    
-    response = await acompletion(**completion_kwargs)
-    async with AsyncTimer(key=f"exec ask_llm"):
-        if stream:
-            async for chunk in response:
-                if only_content:
-                    if chunk.choices and chunk.choices[0] and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-                else:
-                    yield chunk
-        else:
-            yield response.choices[0].message.content if only_content else response
+    return completion_kwargs
+
+
+@lru_cache(maxsize=128)
+def _supports_stream_usage(model: str) -> bool:
+    if os.getenv("LLM_STREAM_USAGE", "true") != "true":
+        return False
+    try:
+        return "stream_options" in (get_supported_openai_params(model=model) or [])
+    except Exception:
+        return False
+
+
+def _attempt_usage(messages: List[Any], output_text: str, usage: Any) -> Tuple[int, int, bool]:
+    """(prompt_tokens, completion_tokens, 是否估算)：优先使用接口返回的 usage，否则本地计数"""
+    if tokens := usage_tokens(usage):
+        return tokens[0], tokens[1], False
+    return estimate_message_tokens(messages, counter=count_tokens), count_tokens(output_text), True
+
+
+async def _acompletion(model: str, completion_kwargs: dict, retry: bool = True):
+    """429 时暂停该模型的调度放行；retry 为 False（有备选模型）时直接抛出由调用方回退"""
+    for attempt in range(LLMScheduler.retries + 1):
+        try:
+            return await acompletion(**completion_kwargs)
+        except Exception as e:
+            if not is_rate_limited(e):
+                raise
+            delay = LLMScheduler.rate_limited(model, e)
+            if not retry or attempt >= LLMScheduler.retries:
+                raise
+            await asyncio.sleep(delay)
+
+
+async def _store_cache(cache_site: Optional[str], cache_key: Optional[str], semantic_key: Optional[tuple],
+                       chunks: List[str]):
+    """只缓存完整生成的结果"""
+    if cache_key:
+        await LLMResponseCache.set(cache_site, cache_key, chunks)
+    if semantic_key:
+        SemanticCache.set(*semantic_key, chunks)
+
+
+async def _close_stream(response):
+    for target in (response, getattr(response, "completion_stream", None)):
+        close = getattr(target, "aclose", None) or getattr(target, "close", None)
+        if close is None:
+            continue
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+            return
+        except Exception as e:
+            logger.warning(f"{RequestIdCtx.request_id} close llm stream error: {e!r}")
 
 
 if __name__ == "__main__":
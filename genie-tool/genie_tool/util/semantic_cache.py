@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+NOISE_PATTERN = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、小写、去掉空白和标点"""
+    return NOISE_PATTERN.sub("", unicodedata.normalize("NFKC", text).lower())
+
+
+def ngram_vector(text: str, n: int = 3, dim: int = 2048, max_chars: int = 20000) -> np.ndarray:
+    """字符 n-gram 哈希向量（L2 归一化），crc32 保证跨进程一致"""
+    text = normalize_text(text)[:max_chars]
+    vector = np.zeros(dim, dtype=np.float32)
+    grams = [text[i:i + n] for i in range(len(text) - n + 1)] or ([text] if text else [])
+    for gram in grams:
+        vector[zlib.crc32(gram.encode("utf-8")) % dim] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def numbers(text: str) -> Tuple[str, ...]:
+    """文本中的数字序列：年份、数量不同的查询即使字面相近也不能复用"""
+    return tuple(NUMBER_PATTERN.findall(unicodedata.normalize("NFKC", text)))
+
+
+class SemanticIndex(object):
+    """单个命名空间的向量索引：暴力余弦检索，TTL 过期 + 满时淘汰最久未访问"""
+
+    def __init__(self, dim: int, max_size: int, ttl: float):
+        self.dim = dim
+        self.max_size = max_size
+        self.ttl = ttl
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._entries: List[Optional[dict]] = []
+        self.evictions = 0
+
+    def __len__(self):
+        return sum(entry is not None for entry in self._entries)
+
+    def _free(self, slot: int):
+        self._entries[slot] = None
+        self._vectors[slot] = 0.0
+
+    def search(self, vector: np.ndarray, text_numbers: Tuple[str, ...], threshold: float) -> Tuple[Optional[dict], float]:
+        if not self._entries:
+            return None, 0.0
+        now = time.time()
+        for slot, entry in enumerate(self._entries):
+            if entry is not None and entry["expire_at"] <= now:
+                self._free(slot)
+        similarities = self._vectors @ vector
+        for slot in np.argsort(-similarities):
+            similarity = float(similarities[slot])
+            if similarity < threshold:
+                break
+            entry = self._entries[slot]
+            if entry is not None and entry["numbers"] == text_numbers:
+                entry["last_access"] = now
+                return entry, similarity
+        return None, float(similarities.max())
+
+    def add(self, vector: np.ndarray, text_numbers: Tuple[str, ...], value: List[str]):
+        now = time.time()
+        entry = {"numbers": text_numbers, "value": value, "expire_at": now + self.ttl, "last_access": now}
+        free_slots = [slot for slot, e in enumerate(self._entries) if e is None]
+        if free_slots:
+            slot = free_slots[0]
+        elif len(self._entries) < self.max_size:
+            slot = len(self._entries)
+            self._entries.append(None)
+            self._vectors = np.vstack([self._vectors, np.zeros((1, self.dim), dtype=np.float32)])
+        else:
+            slot = min(range(len(self._entries)), key=lambda s: self._entries[s]["last_access"])
+            self.evictions += 1
+        self._entries[slot] = entry
+        self._vectors[slot] = vector
+
+
+class _SemanticCache(object):
+    """LLM 语义缓存（按调用点开启）：调用方给出语义文本（如用户查询），
+    与已缓存文本的字符 n-gram 余弦相似度 >= 阈值且数字完全一致时复用输出
+
+    仅进程内存，命名空间为 调用点 + 模型 + 采样参数 + 上下文（精确匹配）。
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLE", "false") == "true"
+        self.sites = {s.strip() for s in os.getenv(
+            "SEMANTIC_CACHE_SITES", "query_decompose_think,query_decompose").split(",") if s.strip()}
+        self.threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.9))
+        # 按调用点覆盖阈值，如 search_reasoning:0.97
+        self.site_thresholds = {
+            site.strip(): float(value)
+            for site, _, value in (item.partition(":") for item in os.getenv(
+                "SEMANTIC_CACHE_SITE_THRESHOLDS", "").split(",") if ":" in item)
+        }
+        self.ngram = int(os.getenv("SEMANTIC_CACHE_NGRAM", 3))
+        self.dim = int(os.getenv("SEMANTIC_CACHE_DIM", 2048))
+        self.max_chars = int(os.getenv("SEMANTIC_CACHE_MAX_CHARS", 20000))
+        self.max_size = int(os.getenv("SEMANTIC_CACHE_MAX_SIZE", 1000))
+        self.ttl = float(os.getenv("SEMANTIC_CACHE_TTL", 86400))
+        self._indexes: Dict[str, SemanticIndex] = {}
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0, "sets": 0, "similarity_sum": 0.0})
+
+    def enabled_for(self, site: Optional[str]) -> bool:
+        return self.enabled and bool(site) and ("*" in self.sites or site in self.sites)
+
+    def threshold_for(self, site: str) -> float:
+        return self.site_thresholds.get(site, self.threshold)
+
+    @staticmethod
+    def namespace(site: str, model: str, stream: bool, context: Optional[str] = None, **params) -> str:
+        """context 为需要精确一致的上下文（如已检索的查询、文档），只有语义文本按相似度匹配"""
+        return json.dumps({"site": site, "model": model, "stream": stream,
+                           "context": hashlib.sha256(context.encode("utf-8")).hexdigest() if context else None,
+                           "params": {k: v for k, v in params.items() if v is not None}},
+                          ensure_ascii=False, sort_keys=True, default=str)
+
+    def vector(self, text: str) -> np.ndarray:
+        return ngram_vector(text, n=self.ngram, dim=self.dim, max_chars=self.max_chars)
+
+    def _index(self, namespace: str) -> SemanticIndex:
+        if namespace not in self._indexes:
+            self._indexes[namespace] = SemanticIndex(dim=self.dim, max_size=self.max_size, ttl=self.ttl)
+        return self._indexes[namespace]
+
+    def get(self, site: str, namespace: str, text: str) -> Optional[List[str]]:
+        stats = self.stats[site]
+        entry, similarity = self._index(namespace).search(self.vector(text), numbers(text), self.threshold_for(site))
+        if entry is None:
+            stats["misses"] += 1
+            return None
+        stats["hits"] += 1
+        stats["similarity_sum"] += similarity
+        return entry["value"]
+
+    def set(self, site: str, namespace: str, text: str, chunks: List[str]):
+        self._index(namespace).add(self.vector(text), numbers(text), chunks)
+        self.stats[site]["sets"] += 1
+
+    def metrics(self) -> dict:
+        sites = {}
+        for site, stats in self.stats.items():
+            total = stats["hits"] + stats["misses"]
+            sites[site] = {
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+                "sets": stats["sets"],
+                "hit_ratio": round(stats["hits"] / total, 4) if total else 0.0,
+                "avg_hit_similarity": round(stats["similarity_sum"] / stats["hits"], 4) if stats["hits"] else 0.0,
+                "threshold": self.threshold_for(site),
+            }
+        return {
+            "enabled": self.enabled,
+            "sites": sites,
+            "size": sum(len(index) for index in self._indexes.values()),
+            "evictions": sum(index.evictions for index in self._indexes.values()),
+        }
+
+
+SemanticCache = _SemanticCache()
+
+
+if __name__ == "__main__":
+    pass
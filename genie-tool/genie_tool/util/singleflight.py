@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _Call(object):
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """合并同一事件循环内相同 key 的并发调用：只执行一次，所有调用方共享结果或异常
+
+    某个调用方被取消不影响其他调用方，全部调用方都取消后才取消实际执行。
+    copy_result 用于给跟随的调用方复制可变结果。
+    """
+
+    def __init__(self, name: str, copy_result: Optional[Callable[[Any], Any]] = None):
+        self.name = name
+        self._copy_result = copy_result
+        self._calls: Dict[asyncio.AbstractEventLoop, Dict[Hashable, _Call]] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def _loop_calls(self) -> Dict[Hashable, _Call]:
+        loop = asyncio.get_running_loop()
+        if loop not in self._calls:
+            for stale_loop in [l for l in self._calls if l.is_closed()]:
+                self._calls.pop(stale_loop, None)
+            self._calls[loop] = {}
+        return self._calls[loop]
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        calls = self._loop_calls()
+        self.stats["calls"] += 1
+        call = calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call(asyncio.create_task(func()))
+            calls[key] = call
+            call.task.add_done_callback(lambda _, c=call: calls.get(key) is c and calls.pop(key))
+        else:
+            self.stats["coalesced"] += 1
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                if calls.get(key) is call:
+                    calls.pop(key)
+            raise
+        call.waiters -= 1
+        return result if leader or self._copy_result is None else self._copy_result(result)
+
+    def metrics(self) -> dict:
+        return {
+            **self.stats,
+            "in_flight": sum(len(calls) for calls in self._calls.values()),
+            "coalesced_ratio": round(self.stats["coalesced"] / self.stats["calls"], 4) if self.stats["calls"] else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    pass
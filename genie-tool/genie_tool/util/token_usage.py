@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from loguru import logger
+
+from genie_tool.model.context import RequestIdCtx
+
+DEFAULT_REQUEST_ID = "default-request-id"
+
+
+def usage_tokens(usage: Any) -> Optional[Tuple[int, int]]:
+    """从 LiteLLM usage 中取 (prompt_tokens, completion_tokens)，没有有效数据时返回 None"""
+    if not usage:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda k: getattr(usage, k, None)
+    prompt, completion = get("prompt_tokens"), get("completion_tokens")
+    if not prompt and not completion:
+        return None
+    return int(prompt or 0), int(completion or 0)
+
+
+class _TokenUsageRecorder(object):
+    """LLM token 使用量：按 RequestIdCtx 的请求 ID 汇总，后台定时（或积累到批量大小时）批量写入
+    对话、会话和用户配额（线程安全，工作线程中的 smolagents 调用也可以记录）
+    """
+
+    def __init__(self):
+        self.persist = os.getenv("LLM_USAGE_PERSIST", "true") == "true"
+        self.flush_interval = float(os.getenv("LLM_USAGE_FLUSH_INTERVAL", 10))
+        self.flush_batch = int(os.getenv("LLM_USAGE_FLUSH_BATCH", 50))
+        self.max_retries = int(os.getenv("LLM_USAGE_FLUSH_RETRIES", 3))
+        # 对话记录可能晚于 LLM 调用写入，找不到对话的使用量保留重试的次数
+        self.unmatched_retries = int(os.getenv("LLM_USAGE_UNMATCHED_RETRIES", 30))
+        self.recent_size = int(os.getenv("LLM_USAGE_RECENT_SIZE", 1000))
+        self._lock = threading.Lock()
+        # request_id -> 待写入的增量
+        self._pending: Dict[str, dict] = {}
+        # 上次写入后新增的请求数，保留重试的请求不计入，避免触发连续写入
+        self._fresh = 0
+        # 最近请求的累计使用量，供按请求查询
+        self._recent: OrderedDict[str, dict] = OrderedDict()
+        self._models = defaultdict(lambda: {"calls": 0, "estimated_calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+        self._flush_tasks: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._flushing = False
+        self.stats = {"flushes": 0, "flushed_requests": 0, "unmatched_requests": 0, "failed_requests": 0,
+                      "dropped_tokens": 0}
+
+    @staticmethod
+    def _empty() -> dict:
+        return {"calls": 0, "estimated_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "models": {},
+                "retries": 0, "unmatched": 0}
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, estimated: bool = False,
+               site: Optional[str] = None, request_id: Optional[str] = None):
+        request_id = request_id or RequestIdCtx.request_id
+        total = prompt_tokens + completion_tokens
+        with self._lock:
+            if request_id not in self._pending:
+                self._fresh += 1
+            for usage in (self._pending.setdefault(request_id, self._empty()),
+                          self._recent.setdefault(request_id, self._empty())):
+                usage["calls"] += 1
+                usage["estimated_calls"] += estimated
+                usage["prompt_tokens"] += prompt_tokens
+                usage["completion_tokens"] += completion_tokens
+                usage["models"][model] = usage["models"].get(model, 0) + total
+            self._recent.move_to_end(request_id)
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+            stats = self._models[model]
+            stats["calls"] += 1
+            stats["estimated_calls"] += estimated
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            fresh = self._fresh
+        logger.info(f"{request_id} llm usage: model={model} site={site} prompt={prompt_tokens} "
+                    f"completion={completion_tokens} estimated={estimated}")
+        self._ensure_flusher(flush_now=fresh >= self.flush_batch)
+
+    def start(self):
+        """在事件循环中启动定时写入（工作线程中记录的使用量依赖它写入）"""
+        self._ensure_flusher()
+
+    def _ensure_flusher(self, flush_now: bool = False):
+        if not self.persist:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 工作线程中没有事件循环，等待事件循环中的定时写入
+            return
+        task = self._flush_tasks.get(loop)
+        if task is None or task.done():
+            for stale_loop in [l for l in self._flush_tasks if l.is_closed()]:
+                self._flush_tasks.pop(stale_loop, None)
+            self._flush_tasks[loop] = loop.create_task(self._flush_loop())
+        if flush_now and not self._flushing:
+            task = loop.create_task(self.flush())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        """把待写入的增量批量写入数据库，写入失败或暂未找到对话的请求留到下次重试（均有次数上限）"""
+        if self._flushing:
+            return
+        with self._lock:
+            batch, self._pending, self._fresh = self._pending, {}, 0
+        batch.pop(DEFAULT_REQUEST_ID, None)
+        if not batch:
+            return
+        self._flushing = True
+        # 已处理（写入、丢弃或放回待写入）的请求，写入被取消时其余请求放回待写入
+        done, current = set(), None
+        try:
+            from genie_tool.services.token_usage_service import TokenUsageService
+
+            service = TokenUsageService()
+            for request_id, usage in batch.items():
+                if current is not None:
+                    done.add(current)
+                current = request_id
+                tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+                try:
+                    # 写入在单个事务中完成，失败时整体回滚，重试不会重复累加
+                    if await service.apply_usage(request_id, tokens):
+                        self.stats["flushed_requests"] += 1
+                        continue
+                    usage["unmatched"] += 1
+                    if usage["unmatched"] > self.unmatched_retries:
+                        self.stats["unmatched_requests"] += 1
+                        self.stats["dropped_tokens"] += tokens
+                        logger.warning(f"{request_id} llm usage has no conversation after "
+                                       f"{self.unmatched_retries} retries, dropped: tokens={tokens}")
+                        continue
+                except Exception as e:
+                    usage["retries"] += 1
+                    if usage["retries"] > self.max_retries:
+                        self.stats["failed_requests"] += 1
+                        self.stats["dropped_tokens"] += tokens
+                        logger.warning(f"{request_id} llm usage flush failed, dropped: tokens={tokens} error={e!r}")
+                        continue
+                with self._lock:
+                    self._merge(request_id, usage)
+            self.stats["flushes"] += 1
+        except asyncio.CancelledError:
+            # 正在写入的请求事务随取消回滚，与未写入的请求一起放回
+            with self._lock:
+                for request_id, usage in batch.items():
+                    if request_id not in done:
+                        self._merge(request_id, usage)
+            raise
+        finally:
+            self._flushing = False
+
+    def _merge(self, request_id: str, usage: dict):
+        pending = self._pending.setdefault(request_id, self._empty())
+        for key in ("calls", "estimated_calls", "prompt_tokens", "completion_tokens"):
+            pending[key] += usage[key]
+        for model, tokens in usage["models"].items():
+            pending["models"][model] = pending["models"].get(model, 0) + tokens
+        pending["retries"] = max(pending["retries"], usage["retries"])
+        pending["unmatched"] = max(pending["unmatched"], usage["unmatched"])
+
+    async def close(self):
+        """停止定时写入并等待进行中的写入结束（被取消的批次已放回待写入），再写入剩余使用量"""
+        loop = asyncio.get_running_loop()
+        task = self._flush_tasks.pop(loop, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self.persist:
+            await self.flush()
+
+    def get(self, request_id: str) -> Optional[dict]:
+        with self._lock:
+            usage = self._recent.get(request_id)
+            if usage is None:
+                return None
+            return {
+                "calls": usage["calls"],
+                "estimated_calls": usage["estimated_calls"],
+                "prompt_tokens": usage["prompt_tokens"],
+                "completion_tokens": usage["completion_tokens"],
+                "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"],
+                "models": dict(usage["models"]),
+            }
+
+    def metrics(self) -> dict:
+        with self._lock:
+            models = {
+                model: {**stats, "total_tokens": stats["prompt_tokens"] + stats["completion_tokens"]}
+                for model, stats in self._models.items()
+            }
+            pending = len(self._pending)
+        return {"persist": self.persist, "pending_requests": pending, **self.stats, "models": models}
+
+
+TokenUsageRecorder = _TokenUsageRecorder()
+
+
+if __name__ == "__main__":
+    pass
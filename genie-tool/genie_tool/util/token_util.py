@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import os
+import re
+from functools import lru_cache
+
+from loguru import logger
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """TOKEN_COUNT_BACKEND=tiktoken 时使用 tiktoken 编码，不可用时退回估算"""
+    if os.getenv("TOKEN_COUNT_BACKEND", "estimate") != "tiktoken":
+        return None
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(os.getenv("TOKEN_COUNT_ENCODING", "cl100k_base"))
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, fallback to estimate: {e!r}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """估算 token 数：中日韩字符约 1 token/字，其余约 4 字符/token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+if __name__ == "__main__":
+    pass
@@ -32,9 +32,30 @@ def log_setting():
     logger.add(log_path, format=log_format, rotation="200 MB")
 
 
+async def close_http_pool():
+    from genie_tool.util.http_util import HttpClientPool
+    await HttpClientPool.close()
+
+
+def close_page_extractor():
+    from genie_tool.tool.search_component.extractor import PageExtractor
+    PageExtractor.shutdown()
+
+
+async def start_token_usage_flusher():
+    from genie_tool.util.token_usage import TokenUsageRecorder
+    TokenUsageRecorder.start()
+
+
+async def flush_token_usage():
+    from genie_tool.util.token_usage import TokenUsageRecorder
+    await TokenUsageRecorder.close()
+
+
 def create_app() -> FastAPI:
     _app = FastAPI(
-        on_startup=[log_setting, print_logo]
+        on_startup=[log_setting, print_logo, start_token_usage_flusher],
+        on_shutdown=[close_http_pool, close_page_extractor, flush_token_usage],
     )
 
     register_middleware(_app)
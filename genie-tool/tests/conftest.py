@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import os
+import tempfile
+
+# 测试不访问网络：litellm 使用内置的模型价格表
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+# 数据库使用临时 sqlite 文件，需在导入 db_engine 之前设置
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="genie-test-"), "test.db")
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+
+from genie_tool.tool.deepsearch import DeepSearch
+
+
+def _stat(elapsed_ms: int, cost_ms: int) -> dict:
+    return {"status": "ok", "elapsedMs": elapsed_ms, "costMs": cost_ms}
+
+
+def test_speculative_saved_time_is_wall_clock():
+    speculative = {"q": None, "q rewrite": None}
+    # 两个投机查询并行且都与分解结果一致，节省时间不随查询数累加
+    stat = DeepSearch._speculative_stat(
+        speculative, decomposed=["q", "q rewrite", "other"], sub_queries=["q", "q rewrite", "other"],
+        query_stats=[_stat(1200, 1200), _stat(1200, 1200), _stat(1500, 500)], start_time=0, decompose_end=1.0)
+    assert stat["matchedQueries"] == ["q", "q rewrite"]
+    # 不做投机时最晚在 1000 + 1200ms 完成，实际 1500ms 完成
+    assert stat["savedMs"] == 700
+
+
+def test_unmatched_speculative_queries_save_nothing():
+    stat = DeepSearch._speculative_stat(
+        {"q": None}, decomposed=["other"], sub_queries=["other", "q"],
+        query_stats=[_stat(1500, 500), _stat(900, 900)], start_time=0, decompose_end=1.0)
+    assert stat["matchedQueries"] == []
+    assert stat["savedMs"] == 0
+
+
+def _search_status(monkeypatch, search) -> str:
+    monkeypatch.setenv("SEARCH_QUERY_TIMEOUT", "0.1")
+    deepsearch = DeepSearch(engines=["bing"])
+    deepsearch._search_single_query = search
+    docs, stat = asyncio.run(deepsearch._search_sub_query("q", "req", 0.0))
+    assert docs == []
+    return stat["status"]
+
+
+def test_query_timeout_status(monkeypatch):
+    async def _slow(query, request_id):
+        await asyncio.sleep(5)
+
+    assert _search_status(monkeypatch, _slow) == "timeout"
+
+
+def test_inner_timeout_is_error(monkeypatch):
+    async def _inner_timeout(query, request_id):
+        # 搜索引擎请求自身超时，不是本查询的总超时
+        raise TimeoutError("engine request timeout")
+
+    assert _search_status(monkeypatch, _inner_timeout) == "error"
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+
+import pytest
+
+from genie_tool.tool.search_component import extractor as extractor_module
+from genie_tool.tool.search_component.extractor import THREAD_ONLY_EXTRACTORS, _PageExtractor, register_extractor
+
+HTML = "<html><body><p>hello world</p></body></html>"
+
+
+def _upper_extractor(html: str) -> str:
+    return "CUSTOM"
+
+
+def _failing_extractor(html: str) -> str:
+    raise ValueError("bad page")
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_custom_extractor_used_in_every_mode(monkeypatch, mode):
+    register_extractor("custom", _upper_extractor)
+    monkeypatch.setenv("PAGE_EXTRACT_MODE", mode)
+    monkeypatch.setenv("PAGE_EXTRACT_BACKEND", "custom")
+    extractor = _PageExtractor()
+    try:
+        assert asyncio.run(extractor.extract(HTML)) == "CUSTOM"
+    finally:
+        extractor.shutdown()
+
+
+def test_failing_extractor_falls_back_to_bs4(monkeypatch):
+    register_extractor("failing", _failing_extractor)
+    monkeypatch.setenv("PAGE_EXTRACT_MODE", "inline")
+    monkeypatch.setenv("PAGE_EXTRACT_BACKEND", "failing")
+    assert asyncio.run(_PageExtractor().extract(HTML)) == "hello world"
+
+
+def _dying_extractor(html: str) -> str:
+    import multiprocessing
+    import os
+    import time
+    # 只在子进程中退出，降级到当前进程执行时正常返回
+    if "die" in html and multiprocessing.parent_process() is not None:
+        os._exit(1)
+    time.sleep(0.2)
+    return "ok"
+
+
+def test_broken_pool_does_not_cancel_other_extractions(monkeypatch):
+    register_extractor("dying", _dying_extractor)
+    monkeypatch.setenv("PAGE_EXTRACT_MODE", "process")
+    monkeypatch.setenv("PAGE_EXTRACT_BACKEND", "dying")
+    extractor = _PageExtractor()
+
+    async def _run():
+        pages = [f"<p>page {i}</p>" for i in range(4)]
+        results = await asyncio.gather(*(extractor.extract(page) for page in pages),
+                                       extractor.extract("<p>die</p>"), return_exceptions=True)
+        # 损坏后重建的进程池仍可使用
+        return results, await extractor.extract("<p>again</p>")
+
+    try:
+        results, again = asyncio.run(_run())
+    finally:
+        extractor.shutdown()
+    assert not any(isinstance(r, BaseException) for r in results)
+    assert results[:4] == ["ok"] * 4
+    assert again == "ok"
+
+
+def test_unpicklable_extractor_runs_in_thread(monkeypatch):
+    local_extractor = lambda html: "LAMBDA"
+    register_extractor("lambda", local_extractor)
+    assert local_extractor in THREAD_ONLY_EXTRACTORS
+    monkeypatch.setenv("PAGE_EXTRACT_MODE", "process")
+    monkeypatch.setenv("PAGE_EXTRACT_BACKEND", "lambda")
+    warnings = []
+    monkeypatch.setattr(extractor_module.logger, "warning", warnings.append)
+    extractor = _PageExtractor()
+    try:
+        assert asyncio.run(extractor.extract(HTML)) == "LAMBDA"
+        assert asyncio.run(extractor.extract(HTML)) == "LAMBDA"
+        # 不再每次走进程池失败后的降级分支，也不会为此创建进程池
+        assert extractor._executor is None
+        assert warnings == []
+    finally:
+        extractor.shutdown()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+from types import SimpleNamespace
+
+import litellm
+import pytest
+
+from genie_tool.model.context import LLMModelInfo, _LLMModelInfoFactory
+from genie_tool.util import llm_util
+from genie_tool.util.token_usage import TokenUsageRecorder
+
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setenv("LLM_ROUTER_ENABLE", "true")
+    monkeypatch.setenv("LLM_ROUTER_MODELS", "a,b,c")
+    monkeypatch.setenv("LLM_ROUTER_SWITCH_RATIO", "0.8")
+    monkeypatch.setenv("LLM_ROUTER_MAX_FAILURES", "2")
+    monkeypatch.setenv("LLM_ROUTER_TTFT_TIMEOUT", "0.2")
+    monkeypatch.setenv("LLM_ROUTER_STALL_TIMEOUT", "0.2")
+    factory = _LLMModelInfoFactory()
+    monkeypatch.setattr(llm_util, "LLMModelInfoFactory", factory)
+    monkeypatch.setattr(TokenUsageRecorder, "persist", False)
+    return factory
+
+
+def _observe(factory: _LLMModelInfoFactory, **ttfts):
+    for model, ttft in ttfts.items():
+        factory.record_success(model, ttft=ttft, output_tokens=0, duration=0.0)
+
+
+def test_route_orders_by_expected_latency(router):
+    _observe(router, a=3.0, b=1.0, c=2.0)
+    assert router.route("a", 100, 0) == ["b", "c", "a"]
+    # 不在路由组内的模型不参与路由
+    assert router.route("other", 100, 0) == ["other"]
+
+
+def test_route_prefers_requested_model_within_switch_ratio(router):
+    _observe(router, a=1.0, b=0.9, c=5.0)
+    assert router.route("a", 100, 0)[0] == "a"
+    _observe(router, b=0.1, c=0.1)
+    assert router.route("a", 100, 0)[0] == "b"
+
+
+def test_route_puts_unhealthy_models_last(router):
+    _observe(router, a=3.0, b=1.0, c=2.0)
+    router.record_failure("b")
+    router.record_failure("b")
+    assert router.route("a", 100, 0) == ["c", "a", "b"]
+
+
+def test_route_skips_models_with_short_context(router):
+    router.register(LLMModelInfo(model="b", context_length=1000, max_output=100))
+    _observe(router, a=3.0, b=1.0, c=2.0)
+    assert router.route("a", 5000, 0) == ["c", "a"]
+
+
+def _chunk(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=None)
+
+
+def _response(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+async def _collect(**kwargs):
+    return [chunk async for chunk in llm_util.ask_llm(messages="hi", model="a", only_content=True, **kwargs)]
+
+
+def test_fallback_when_first_token_is_slow(router, monkeypatch):
+    calls = []
+
+    async def _acompletion(model, **kwargs):
+        calls.append(model)
+        if model == "a":
+            await asyncio.sleep(5)
+        return _response(f"from {model}")
+
+    monkeypatch.setattr(llm_util, "acompletion", _acompletion)
+    assert asyncio.run(_collect()) == ["from b"]
+    assert calls == ["a", "b"]
+    assert router.metrics()["models"]["a"]["timeouts"] == 1
+
+
+def test_midstream_fallback_when_stream_stalls(router, monkeypatch):
+    monkeypatch.setenv("LLM_ROUTER_MIDSTREAM_FALLBACK", "true")
+    calls = []
+
+    async def _acompletion(model, messages, **kwargs):
+        calls.append((model, messages))
+
+        async def _stream():
+            yield _chunk(f"{model}-1 ")
+            if model == "a":
+                await asyncio.sleep(5)
+            yield _chunk(f"{model}-2")
+
+        return _stream()
+
+    monkeypatch.setattr(llm_util, "acompletion", _acompletion)
+    assert asyncio.run(_collect(stream=True)) == ["a-1 ", "b-1 ", "b-2"]
+    # 备选模型带上已输出的内容续写
+    assert calls[1][0] == "b"
+    assert calls[1][1][-2] == {"role": "assistant", "content": "a-1 "}
+
+
+def test_only_unavailability_counts_toward_health(router, monkeypatch):
+    errors = {
+        "a": litellm.ContextWindowExceededError(message="too long", model="a", llm_provider="openai"),
+        "b": litellm.ServiceUnavailableError(message="down", model="b", llm_provider="openai"),
+    }
+
+    async def _acompletion(model, **kwargs):
+        if model in errors:
+            raise errors[model]
+        return _response("ok")
+
+    monkeypatch.setattr(llm_util, "acompletion", _acompletion)
+    assert asyncio.run(_collect()) == ["ok"]
+    models = router.metrics()["models"]
+    assert models["a"]["errors"] == 0
+    assert models["b"]["errors"] == 1
+    assert models["c"]["calls"] == 1
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from genie_tool.util.llm_scheduler import LLMOverloadedError, _LLMScheduler
+
+
+@pytest.fixture
+def make_scheduler(monkeypatch):
+    def _make(**env) -> _LLMScheduler:
+        defaults = {"LLM_SCHEDULER_ENABLE": "true", "LLM_DEFAULT_CONCURRENCY": "1", "LLM_DEFAULT_TPM": "0",
+                    "LLM_QUEUE_LIMITS": "", "LLM_QUEUE_TIMEOUT": "5", "LLM_RATE_LIMIT_COOLDOWN": "0.2"}
+        for key, value in {**defaults, **env}.items():
+            monkeypatch.setenv(key, value)
+        return _LLMScheduler()
+
+    return _make
+
+
+async def _hold(scheduler: _LLMScheduler, release: asyncio.Event, tokens: int = 0, priority: str = "default"):
+    async with scheduler.slot("m", tokens, priority):
+        await release.wait()
+
+
+def test_admission_follows_priority_order(make_scheduler):
+    scheduler = make_scheduler()
+    order = []
+
+    async def _call(name: str, priority: str):
+        async with scheduler.slot("m", 0, priority):
+            order.append(name)
+
+    async def _run():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(scheduler, release))
+        await asyncio.sleep(0.01)
+        tasks = [asyncio.create_task(_call(name, name)) for name in ("batch", "default", "interactive")]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+
+    asyncio.run(_run())
+    assert order == ["interactive", "default", "batch"]
+
+
+def test_queue_limit_rejects_new_waiters(make_scheduler):
+    scheduler = make_scheduler(LLM_QUEUE_LIMITS="batch:1")
+
+    async def _run():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(scheduler, release))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(_hold(scheduler, release, priority="batch"))
+        await asyncio.sleep(0.01)
+        assert scheduler.overloaded("m", "batch")
+        assert not scheduler.overloaded("m", "interactive")
+        with pytest.raises(LLMOverloadedError):
+            async with scheduler.slot("m", 0, "batch"):
+                pass
+        release.set()
+        await asyncio.gather(holder, queued)
+
+    asyncio.run(_run())
+    assert scheduler.metrics()["models"]["m"]["rejected"] == 1
+
+
+def test_queue_timeout_raises_and_leaves_queue(make_scheduler):
+    scheduler = make_scheduler(LLM_QUEUE_TIMEOUT="0.1")
+
+    async def _run():
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(scheduler, release))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMOverloadedError):
+            async with scheduler.slot("m", 0):
+                pass
+        release.set()
+        await holder
+
+    asyncio.run(_run())
+    metrics = scheduler.metrics()["models"]["m"]
+    assert metrics["timeouts"] == 1
+    assert sum(metrics["waiting"].values()) == 0
+    assert metrics["running"] == 0
+
+
+def test_rate_limit_pauses_admission(make_scheduler):
+    scheduler = make_scheduler(LLM_DEFAULT_CONCURRENCY="4")
+    error = SimpleNamespace(response=SimpleNamespace(headers={"retry-after": "0.3"}))
+
+    async def _run():
+        assert scheduler.rate_limited("m", error) == 0.3
+        start = time.monotonic()
+        async with scheduler.slot("m", 0):
+            return time.monotonic() - start
+
+    assert 0.25 <= asyncio.run(_run()) < 1.0
+    assert scheduler.metrics()["models"]["m"]["rate_limited"] == 1
+
+
+def test_settle_refunds_unused_reserved_tokens(make_scheduler):
+    scheduler = make_scheduler(LLM_DEFAULT_CONCURRENCY="4", LLM_DEFAULT_TPM="6000")
+
+    async def _run():
+        async with scheduler.slot("m", 3000) as lease:
+            lease.settle(1000)
+        settled = scheduler.metrics()["models"]["m"]["available_tokens"]
+        async with scheduler.slot("m", 3000):
+            pass
+        return settled, scheduler.metrics()["models"]["m"]["available_tokens"]
+
+    settled, unsettled = asyncio.run(_run())
+    # 实际只用了 1000，退回 2000；未修正的调用按预留额度扣减
+    assert 5000 <= settled < 5100
+    assert 2000 <= unsettled < 2200
+
+
+def test_short_wait_reschedules_pending_timer(make_scheduler):
+    scheduler = make_scheduler(LLM_DEFAULT_CONCURRENCY="4", LLM_DEFAULT_TPM="600", LLM_QUEUE_TIMEOUT="0")
+
+    async def _run():
+        async with scheduler.slot("m", 600) as lease:
+            lease.settle(600)
+        # 令牌桶已空：批量请求需要约 60 秒，交互请求只需约 1 秒
+        batch = asyncio.create_task(_hold(scheduler, asyncio.Event(), tokens=600, priority="batch"))
+        await asyncio.sleep(0.01)
+        start = time.monotonic()
+        async with scheduler.slot("m", 10, "interactive"):
+            waited = time.monotonic() - start
+        batch.cancel()
+        await asyncio.gather(batch, return_exceptions=True)
+        return waited
+
+    assert asyncio.run(_run()) < 3
+
+
+def test_sync_and_async_slots_share_concurrency(make_scheduler):
+    scheduler = make_scheduler()
+    events = []
+
+    def _sync_call(entered: threading.Event, release: threading.Event):
+        with scheduler.sync_slot("m", 0):
+            events.append("sync enter")
+            entered.set()
+            release.wait()
+            events.append("sync exit")
+
+    async def _run():
+        entered, release = threading.Event(), threading.Event()
+        thread = asyncio.create_task(asyncio.to_thread(_sync_call, entered, release))
+        await asyncio.to_thread(entered.wait)
+
+        async def _async_call():
+            async with scheduler.slot("m", 0):
+                events.append("async enter")
+
+        waiter = asyncio.create_task(_async_call())
+        await asyncio.sleep(0.05)
+        assert events == ["sync enter"]
+        release.set()
+        await asyncio.gather(thread, waiter)
+
+        # 反过来：协程持有时工作线程排队
+        async_release = asyncio.Event()
+        holder = asyncio.create_task(_hold(scheduler, async_release))
+        await asyncio.sleep(0.01)
+        entered, release = threading.Event(), threading.Event()
+        release.set()
+        thread = asyncio.create_task(asyncio.to_thread(_sync_call, entered, release))
+        await asyncio.sleep(0.05)
+        assert not entered.is_set()
+        async_release.set()
+        await asyncio.gather(holder, thread)
+
+    asyncio.run(_run())
+    assert events == ["sync enter", "sync exit", "async enter", "sync enter", "sync exit"]
+
+
+def test_scheduled_litellm_model_retries_after_rate_limit(make_scheduler, monkeypatch):
+    from smolagents import ChatMessage, LiteLLMModel
+
+    from genie_tool.tool import code_interpreter
+    from genie_tool.util.token_usage import TokenUsageRecorder
+
+    scheduler = make_scheduler(LLM_RATE_LIMIT_RETRIES="1")
+    monkeypatch.setattr(code_interpreter, "LLMScheduler", scheduler)
+    monkeypatch.setattr(TokenUsageRecorder, "persist", False)
+    calls = []
+
+    class _RateLimitError(Exception):
+        status_code = 429
+
+    def _generate(self, messages, *args, **kwargs):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise _RateLimitError("429")
+        return ChatMessage(role="assistant", content="ok")
+
+    monkeypatch.setattr(LiteLLMModel, "generate", _generate)
+    model = code_interpreter.ScheduledLiteLLMModel(model_id="m")
+    message = model.generate([{"role": "user", "content": "hi"}])
+    assert message.content == "ok"
+    assert len(calls) == 2 and calls[1] - calls[0] >= 0.2
+    metrics = scheduler.metrics()["models"]["m"]
+    assert metrics["rate_limited"] == 1
+    assert metrics["running"] == 0
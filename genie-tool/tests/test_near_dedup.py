@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.near_dedup import NearDupIndex, simhash
+
+
+def _doc(content: str) -> Doc:
+    return Doc(doc_type="web_page", content=content, title="", link="")
+
+
+def test_simhash_without_grams_is_none():
+    assert simhash("—— ！！ ... \n\n ——") is None
+    assert simhash("正文内容") is not None
+
+
+def test_docs_without_fingerprint_never_match():
+    index = NearDupIndex(threshold=3, min_length=10)
+    punctuation = ["-" * 50, "=" * 50, "!?" * 30]
+    text = "这是一段足够长的正文内容，用来验证近似去重不会误伤其他文档。" * 3
+    docs = index.dedup([_doc(c) for c in punctuation + [text, text + "。"]])
+    # 无指纹的文档只做精确去重，也不会让后续正文被判为重复
+    assert [d.content for d in docs] == punctuation + [text]
+    assert index.stats["near_dup"] == 1
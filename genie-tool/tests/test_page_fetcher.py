@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+
+import pytest
+
+from genie_tool.tool.search_component.page_fetcher import read_text_capped
+
+
+class _FakeContent:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def iter_chunked(self, size: int):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+class _FakeResponse:
+    charset = "utf-8"
+    url = "https://example.com/"
+
+    def __init__(self, body: bytes):
+        self.content = _FakeContent(body)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+BODY = ("<p>" + "正文内容" * 5000 + "</p>").encode("utf-8")
+
+
+@pytest.mark.parametrize("max_bytes", [0, -1])
+def test_non_positive_max_bytes_is_unlimited(max_bytes):
+    response = _FakeResponse(BODY)
+    text = asyncio.run(read_text_capped(response, max_bytes, chunk_size=1024))
+    assert text == BODY.decode("utf-8")
+    assert not response.closed
+
+
+def test_max_bytes_truncates_and_closes():
+    response = _FakeResponse(BODY)
+    text = asyncio.run(read_text_capped(response, 8192, chunk_size=1024))
+    # 截断处的半个字符被替换为 U+FFFD
+    text = text.rstrip("\ufffd")
+    assert 0 < len(text.encode("utf-8")) <= 8192
+    assert BODY.decode("utf-8").startswith(text)
+    assert response.closed
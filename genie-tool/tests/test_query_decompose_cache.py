@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from genie_tool.tool.search_component.query_process import query_decompose
+from genie_tool.util import llm_util
+from genie_tool.util.llm_cache import _LLMResponseCache
+from genie_tool.util.semantic_cache import _SemanticCache
+from genie_tool.util.token_usage import TokenUsageRecorder
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_ENABLE", "true")
+    monkeypatch.setenv("LLM_CACHE_BACKEND", "memory")
+    monkeypatch.setenv("LLM_CACHE_SITES", "query_decompose_think,query_decompose")
+    monkeypatch.setattr(llm_util, "LLMResponseCache", _LLMResponseCache())
+    monkeypatch.setattr(TokenUsageRecorder, "persist", False)
+    calls = []
+
+    async def _acompletion(**kwargs):
+        calls.append(kwargs)
+
+        async def _stream():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"- sub {len(calls)}\n"))])
+
+        return _stream()
+
+    monkeypatch.setattr(llm_util, "acompletion", _acompletion)
+    return calls
+
+
+def test_decompose_cache_hit_within_first_loop(llm_calls):
+    async def _run():
+        return await query_decompose("q", single_pass=True), await query_decompose("q", single_pass=True)
+
+    first, second = asyncio.run(_run())
+    assert first == second == ["sub 1"]
+    assert len(llm_calls) == 1
+
+
+def test_decompose_cache_not_replayed_in_later_loops(llm_calls):
+    async def _run():
+        first = await query_decompose("q", single_pass=True)
+        # 后续轮次带上已检索的查询，不能拿到首轮的分解结果
+        return first, await query_decompose("q", single_pass=True, searched_queries=first)
+
+    first, second = asyncio.run(_run())
+    assert first == ["sub 1"]
+    assert second == ["sub 2"]
+    assert len(llm_calls) == 2
+
+
+@pytest.fixture
+def semantic_llm_calls(llm_calls, monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_ENABLE", "false")
+    monkeypatch.setattr(llm_util, "LLMResponseCache", _LLMResponseCache())
+    monkeypatch.setenv("SEMANTIC_CACHE_ENABLE", "true")
+    monkeypatch.setattr(llm_util, "SemanticCache", _SemanticCache())
+    return llm_calls
+
+
+def test_semantic_cache_reuses_reworded_first_decomposition(semantic_llm_calls):
+    async def _run():
+        return (await query_decompose("2024年中国GDP增速是多少", single_pass=True),
+                await query_decompose("2024年中国GDP增速是多少？", single_pass=True))
+
+    first, second = asyncio.run(_run())
+    assert first == second == ["sub 1"]
+    assert len(semantic_llm_calls) == 1
+
+
+def test_semantic_cache_requires_same_searched_queries(semantic_llm_calls):
+    async def _run():
+        first = await query_decompose("2024年中国GDP增速是多少", single_pass=True)
+        # 相似的追问在后续轮次中不能复用首轮的分解结果
+        return first, await query_decompose("2024年中国GDP增速是多少？", single_pass=True, searched_queries=first)
+
+    first, second = asyncio.run(_run())
+    assert (first, second) == (["sub 1"], ["sub 2"])
+    assert len(semantic_llm_calls) == 2
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import pytest
+
+from genie_tool.tool.search_component.query_process import rewrite_query
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("请问北京天气怎么样？", ["北京天气"]),
+    ("帮我查一下2024年GDP", ["2024年GDP"]),
+    ("麻烦帮我搜一下量子计算是什么", ["量子计算"]),
+    ("搜索：大模型推理优化", ["大模型推理优化"]),
+    ("查一下 北京", ["北京"]),
+    ("Please tell me what is RAG?", ["what is RAG"]),
+])
+def test_rewrite_query_strips_polite_prefix(query, expected):
+    assert rewrite_query(query) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    # 前缀词是正文词语的一部分，不能截断
+    ("请假制度有哪些", ["请假制度"]),
+    ("搜索引擎优化技巧", []),
+    ("查询优化器原理", []),
+    ("麻烦的意思", []),
+    ("帮我们的团队", []),
+])
+def test_rewrite_query_keeps_words_starting_with_prefix(query, expected):
+    assert rewrite_query(query) == expected
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import time
+
+import pytest
+
+from genie_tool.model.document import Doc
+from genie_tool.tool.search_component import search_engine
+from genie_tool.tool.search_component.engine_stats import _EngineStats
+from genie_tool.tool.search_component.search_engine import MixSearch, SearchBase
+
+
+class _FakeEngine(SearchBase):
+
+    def __init__(self, fail: bool):
+        super().__init__()
+        self._engine = "fake"
+        self.fail = fail
+        self.calls = 0
+
+    async def search(self, query: str, request_id: str = None, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        if self.fail:
+            raise RuntimeError("engine down")
+        return [Doc(doc_type="web_page", content="", title=query, link=f"https://example.com/{query}")]
+
+
+class _DictCache(object):
+
+    enabled = True
+
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, engine, query, count):
+        return self._data.get((engine, query, count))
+
+    async def set(self, engine, query, count, docs):
+        self._data[(engine, query, count)] = docs
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = _EngineStats()
+    stats._min_samples = 1
+    monkeypatch.setattr(search_engine, "EngineStats", stats)
+    monkeypatch.setattr(search_engine, "SearchResultCache", _DictCache())
+    return stats
+
+
+def test_cache_hit_not_recorded_as_engine_success(stats):
+    mix, engine = MixSearch(), _FakeEngine(fail=False)
+
+    async def _run():
+        await mix._search_engine(engine, "q")
+        for _ in range(10):
+            await mix._search_engine(engine, "q")
+
+    asyncio.run(_run())
+    assert engine.calls == 1
+    metrics = stats.metrics()["fake"]
+    assert metrics["samples"] == 1
+    assert metrics["p50"] >= 0.02
+
+
+def test_cache_hit_does_not_reset_breaker(stats):
+    mix, engine = MixSearch(), _FakeEngine(fail=True)
+
+    async def _run():
+        await search_engine.SearchResultCache.set("fake", "cached", engine._count, [
+            Doc(doc_type="web_page", content="", title="cached", link="https://example.com/cached")])
+        for query in ["a", "cached", "b", "cached", "c", "cached", "d", "cached", "e"]:
+            try:
+                await mix._search_engine(engine, query)
+            except RuntimeError:
+                pass
+
+    asyncio.run(_run())
+    metrics = stats.metrics()["fake"]
+    assert metrics["samples"] == 0
+    assert metrics["consecutive_failures"] == 5
+    assert metrics["error_rate"] == 1.0
+    assert metrics["breaker"] == "open"
+
+
+class _ManyResultsEngine(_FakeEngine):
+
+    async def search(self, query: str, request_id: str = None, *args, **kwargs):
+        return [Doc(doc_type="web_page", content="", title=f"{query} {i}", link=f"https://example.com/{i}")
+                for i in range(5)]
+
+
+@pytest.mark.parametrize("rank_fusion", ["true", "false"])
+def test_top_n_applied_with_and_without_rank_fusion(stats, monkeypatch, rank_fusion):
+    monkeypatch.setenv("MIX_SEARCH_RANK_FUSION", rank_fusion)
+    monkeypatch.setenv("MIX_SEARCH_TOP_N", "2")
+    mix = MixSearch()
+    mix._bing_engine = _ManyResultsEngine(fail=False)
+    docs = asyncio.run(mix.search("q", use_bing=True, use_jina=False, use_sogou=False, use_serp=False))
+    assert [doc.link for doc in docs] == ["https://example.com/0", "https://example.com/1"]
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import SQLModel
+
+from genie_tool.db.db_engine import async_engine, async_session_local
+from genie_tool.services.token_usage_service import TokenUsageService
+from genie_tool.util.token_usage import _TokenUsageRecorder
+
+
+async def _reset_db():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+
+async def _create_conversation(request_id: str, session_id: str = "s-1", user_id: int = None):
+    # Session 模型的 metadata 字段与 SQLModel 冲突无法实例化，测试数据直接用 SQL 写入
+    async with async_session_local() as db:
+        if user_id is not None:
+            await db.execute(text(
+                "insert or ignore into users (id, username, email, password_hash, role, status, api_quota_daily, "
+                "api_quota_used) values (:u, :name, :email, 'x', 'USER', 'ACTIVE', 100, 0)"),
+                {"u": user_id, "name": f"u{user_id}", "email": f"u{user_id}@example.com"})
+        await db.execute(text(
+            "insert or ignore into sessions (session_id, user_id, title, status, message_count, total_tokens_used) "
+            "values (:s, :u, 't', 'ACTIVE', 0, 0)"), {"s": session_id, "u": user_id})
+        await db.execute(text(
+            "insert into conversations (session_id, request_id, message_type, status) "
+            "values (:s, :r, 'USER', 'SUCCESS')"), {"s": session_id, "r": request_id})
+        await db.commit()
+
+
+async def _totals(request_id: str, session_id: str = "s-1", user_id: int = None):
+    async with async_session_local() as db:
+        conversation = (await db.execute(
+            text("select token_usage from conversations where request_id = :r"), {"r": request_id})).scalar()
+        session = (await db.execute(
+            text("select total_tokens_used from sessions where session_id = :s"), {"s": session_id})).scalar()
+        quota = (await db.execute(
+            text("select api_quota_used from users where id = :u"), {"u": user_id})).scalar()
+        return conversation, session, quota
+
+
+@pytest.fixture
+def db():
+    asyncio.run(_reset_db())
+
+
+def test_apply_usage_updates_conversation_session_and_quota(db):
+    async def _run():
+        await _create_conversation("r-1", user_id=1)
+        service = TokenUsageService()
+        assert await service.apply_usage("r-1", 100)
+        assert await service.apply_usage("r-1", 20)
+        assert not await service.apply_usage("missing", 5)
+        return await _totals("r-1", user_id=1)
+
+    # 配额默认按请求计数，同一请求多次写入只计 1 次
+    assert asyncio.run(_run()) == (120, 120, 1)
+
+
+def test_apply_usage_rolls_back_on_failure(db):
+    async def _run():
+        await _create_conversation("r-1", user_id=1)
+        async with async_engine.begin() as conn:
+            await conn.execute(text("drop table users"))
+        with pytest.raises(Exception):
+            await TokenUsageService().apply_usage("r-1", 100)
+        async with async_session_local() as session:
+            conversation = (await session.execute(
+                text("select token_usage from conversations where request_id = 'r-1'"))).scalar()
+            total = (await session.execute(
+                text("select total_tokens_used from sessions where session_id = 's-1'"))).scalar()
+        return conversation, total
+
+    # 配额写入失败时对话和会话的累加一并回滚，重试不会重复计数
+    assert asyncio.run(_run()) == (None, 0)
+
+
+def test_unmatched_usage_is_kept_until_conversation_exists(db, monkeypatch):
+    monkeypatch.setenv("LLM_USAGE_PERSIST", "false")
+    monkeypatch.setenv("LLM_USAGE_UNMATCHED_RETRIES", "2")
+    recorder = _TokenUsageRecorder()
+    request_id = f"r-{uuid.uuid4()}"
+
+    async def _run():
+        recorder.record("gpt-4.1", 10, 5, request_id=request_id)
+        await recorder.flush()
+        assert recorder.metrics()["pending_requests"] == 1
+        await _create_conversation(request_id)
+        await recorder.flush()
+        return await _totals(request_id)
+
+    assert asyncio.run(_run())[:2] == (15, 15)
+    assert recorder.metrics()["pending_requests"] == 0
+    assert recorder.stats["flushed_requests"] == 1
+
+
+def test_unmatched_usage_dropped_after_retries(db, monkeypatch):
+    monkeypatch.setenv("LLM_USAGE_PERSIST", "false")
+    monkeypatch.setenv("LLM_USAGE_UNMATCHED_RETRIES", "2")
+    recorder = _TokenUsageRecorder()
+
+    async def _run():
+        recorder.record("gpt-4.1", 10, 5, request_id="no-conversation")
+        for _ in range(3):
+            await recorder.flush()
+
+    asyncio.run(_run())
+    assert recorder.metrics()["pending_requests"] == 0
+    assert recorder.stats["unmatched_requests"] == 1
+    assert recorder.stats["dropped_tokens"] == 15
+
+
+class _SlowService(object):
+    applied = []
+
+    async def apply_usage(self, request_id: str, tokens_used: int) -> bool:
+        await asyncio.sleep(0.2)
+        self.applied.append((request_id, tokens_used))
+        return True
+
+
+def test_close_requeues_and_writes_in_flight_flush(monkeypatch):
+    from genie_tool.services import token_usage_service
+
+    monkeypatch.setattr(token_usage_service, "TokenUsageService", _SlowService)
+    monkeypatch.setattr(_SlowService, "applied", [])
+    monkeypatch.setenv("LLM_USAGE_FLUSH_INTERVAL", "0.01")
+    recorder = _TokenUsageRecorder()
+
+    async def _run():
+        recorder.record("gpt-4.1", 10, 5, request_id="r-1")
+        recorder.record("gpt-4.1", 1, 1, request_id="r-2")
+        # 等定时写入开始并卡在第一个请求上
+        await asyncio.sleep(0.05)
+        assert recorder._flushing
+        await recorder.close()
+
+    asyncio.run(_run())
+    assert sorted(_SlowService.applied) == [("r-1", 15), ("r-2", 2)]
+    assert recorder.metrics()["pending_requests"] == 0
+
+
+def test_close_waits_for_background_flush(monkeypatch):
+    from genie_tool.services import token_usage_service
+
+    monkeypatch.setattr(token_usage_service, "TokenUsageService", _SlowService)
+    monkeypatch.setattr(_SlowService, "applied", [])
+    monkeypatch.setenv("LLM_USAGE_FLUSH_BATCH", "1")
+    recorder = _TokenUsageRecorder()
+
+    async def _run():
+        recorder.record("gpt-4.1", 10, 5, request_id="r-1")
+        await asyncio.sleep(0)
+        await recorder.close()
+
+    asyncio.run(_run())
+    assert _SlowService.applied == [("r-1", 15)]
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# =====================
+#
+#
+# Author: liumin.423
+# Date:   2025/7/9
+# =====================
+import pytest
+
+from genie_tool.model.document import Doc
+from genie_tool.tool.search_component.url_canonical import merge_docs_by_url, url_key
+
+
+def _doc(link: str, engine: str = "bing") -> Doc:
+    return Doc(doc_type="web_page", content="", title=link, link=link, data={"search_engine": engine})
+
+
+def test_tracking_params_ignored_in_key():
+    assert url_key("https://www.example.com/a?utm_source=x&id=1&gclid=2&spm=a.b") == \
+        url_key("http://example.com/a/?id=1")
+
+
+@pytest.mark.parametrize("param", ["from", "ref", "fr", "amp", "outputtype"])
+def test_content_params_kept_in_key(param):
+    assert url_key(f"https://example.com/a?{param}=1") != url_key(f"https://example.com/a?{param}=2")
+
+
+def test_merge_keeps_original_link_for_fetch():
+    link = "https://Example.com:443/a?utm_source=x&id=1#top"
+    docs = merge_docs_by_url([_doc(link), _doc("https://example.com/a?id=1", engine="jina")])
+    assert len(docs) == 1
+    assert docs[0].link == link
+    assert [e["engine"] for e in docs[0].data["engines"]] == ["bing", "jina"]